@@ -1,2 +1,8 @@
-from .graph import Graph
+import os
+import sys
+
+# The modules import each other by name (as when running main.py from src/), which requires src/ on the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from graph import Graph
 from tests.test_graph import test_spatial_complexity
\ No newline at end of file
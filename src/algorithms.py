@@ -2,60 +2,103 @@ import random
 import math
 import time
 import copy
+import itertools
+import os
+import re
+import tempfile
+from collections import deque
+import numpy as np
 import networkx as nx
+import pulp
 from contraints import shuffle_graph
+from compact_graph import CompactGraph
+from local_search import LocalSearch
+
+# Crossover operators of the genetic algorithm working on giant tours, by name
+GIANT_TOUR_CROSSOVERS = {
+    "ox": "order_crossover",
+    "pmx": "partially_mapped_crossover",
+    "erx": "edge_recombination_crossover",
+}
+
+# Adaptive annealing schedule (see `Algorithms.simulated_annealing`)
+# Probability of accepting the average uphill move at the calibrated initial temperature, low since
+# the "split" initial solutions are already good and a hot start only walks away from them
+INITIAL_ACCEPTANCE = 0.02
+# Number of random moves sampled to calibrate the initial temperature
+CALIBRATION_MOVES = 500
+# Moves tried at each temperature, per node of the graph, with a minimum
+MOVES_PER_NODE = 10
+MIN_LEVEL_MOVES = 100
+# Above this acceptance rate the search is still a random walk, and cools with FAST_COOLING_RATE
+HIGH_ACCEPTANCE = 0.4
+FAST_COOLING_RATE = 0.8
+# Below this acceptance rate the search is frozen: it is reheated if the best solution did not improve
+# during the last REHEAT_LEVELS temperature levels, at most MAX_REHEATS times
+FROZEN_ACCEPTANCE = 0.002
+REHEAT_LEVELS = 10
+MAX_REHEATS = 3
+# A reheat sets the temperature to this fraction of the initial one
+REHEAT_RATIO = 0.1
 
 class Algorithms:
     def __init__(self):
         pass
 
     @staticmethod
-    def simulated_annealing(graph, initial_temp, min_temp, cooling_rate, max_iterations, num_vehicles):
+    def simulated_annealing(graph, initial_temp, min_temp, cooling_rate, max_iterations, num_vehicles,
+                            metric_closure=False, seed=None, stop=None, debug=False, initialization="random",
+                            polish=False, schedule="geometric", time_limit=None, max_stagnation=None):
         """
         Simulated annealing algorithm for the multi-vehicle TSP problem.
-        """
-        start_time = time.perf_counter()
-
-        nodes = list(graph.graph.nodes)
-        start_node = random.choice(nodes)
-        nodes.remove(start_node)
-
-        current_solution = Algorithms.initialize_solution(nodes, start_node, num_vehicles, graph)
-        best_solution = copy.deepcopy(current_solution)
-        current_cost = Algorithms.compute_total_cost(graph, current_solution)
-        best_cost = current_cost
 
-        for vehicle_id, path in best_solution.items():
-            graph.set_tsp_path(vehicle_id, path)
+        With `metric_closure=True` the search runs on the complete graph of shortest path distances
+        (see `Graph.metric_closure`), so that no move is rejected because two consecutive nodes are
+        not adjacent, and the final tours are expanded back into paths of real edges. This is much
+        faster to converge on sparse graphs.
 
-        temp = initial_temp
+        With a `seed`, all the random draws (depot, initial solution, moves, acceptance) come from a
+        private `random.Random(seed)` and the run is reproducible; otherwise the global `random`
+        state is used. `stop` is an optional event (anything with an `is_set` method), checked at
+        each temperature step, that ends the run early with the best solution found so far.
 
-        number_iterations = 0
-        number_saves = 0
-        while temp > min_temp:
-            for _ in range(max_iterations):
-                neighbor_solution = Algorithms.generate_neighbor_multi_vehicle(graph, current_solution)
-                neighbor_cost = Algorithms.compute_total_cost(graph, neighbor_solution)
+        Moves are only checked on the edges they create. With `debug=True` the whole solution is
+        validated again after each accepted move, which is much slower but catches any bookkeeping error.
 
-                delta = neighbor_cost - current_cost
-                if delta < 0 or random.random() < math.exp(-delta / temp):
-                    current_solution = neighbor_solution
-                    current_cost = neighbor_cost
+        The initial solution is built by `initialize_solution` with the `initialization` strategy:
+        "random" (the default) or "split" (nearest neighbor giant tour, optimally split). "split" gives a much
+        better start but builds the dense n x n `Graph.metric_closure`, even with `metric_closure=False`.
+        With `polish=True` the best solution is improved by `local_search` at the end.
 
-                    if neighbor_cost < best_cost:
-                        best_solution = copy.deepcopy(neighbor_solution)
-                        best_cost = neighbor_cost
+        The "geometric" `schedule` multiplies the temperature by `cooling_rate` after `max_iterations` moves,
+        from `initial_temp` down to `min_temp`. The "adaptive" schedule scales with the graph instead:
+            - the initial temperature is calibrated on sampled moves (see `calibrate_temperature`),
+              `initial_temp` is only used if no sampled move increases the cost,
+            - each temperature level tries MOVES_PER_NODE moves per node instead of `max_iterations`,
+            - levels accepting more than HIGH_ACCEPTANCE of the moves are cooled by FAST_COOLING_RATE,
+              the others by `cooling_rate`,
+            - once frozen (less than FROZEN_ACCEPTANCE of the moves accepted) and REHEAT_LEVELS levels without
+              improving the best solution, the temperature goes back up to REHEAT_RATIO times the initial
+              one, at most MAX_REHEATS times, then the run stops.
+        With both schedules the run also stops after `time_limit` seconds, after `max_stagnation` levels
+        without improving the best solution, or below `min_temp`.
 
-                        for vehicle_id, path in best_solution.items():
-                            graph.set_tsp_path(vehicle_id, path)
-                if number_iterations % 500 == 0:
-                    graph.tsp_paths = current_solution
-                    #graph.save_graph_png("./data/results/gif/result_graph_{}.png".format(number_saves), True, current_solution)
-                    number_saves += 1
-                number_iterations += 1
+        The search itself is an `anytime.AnnealingSolver`, which can be used directly to read the best
+        solution during the run, or to stop it and resume it later.
+        """
+        # Imported here, the anytime module depends on this one
+        from anytime import AnnealingSolver
 
-            #print(f"Temperature: {temp:.2f}, Current cost: {current_cost:.2f}, Best cost: {best_cost:.2f}")
-            temp *= cooling_rate
+        start_time = time.perf_counter()
+        solver = AnnealingSolver(graph, initial_temp, min_temp, cooling_rate, max_iterations, num_vehicles,
+                                 metric_closure, seed, debug, initialization, schedule, max_stagnation)
+        remaining = None if time_limit is None else time_limit - (time.perf_counter() - start_time)
+        best_solution, _ = solver.run(time_limit=remaining, stop=stop)
+        if polish:
+            best_solution = Algorithms.local_search(graph, best_solution)
+        graph.tsp_paths = {}
+        for vehicle_id, path in best_solution.items():
+            graph.set_tsp_path(vehicle_id, path)
 
         # Display best solution during 3s in the GIF
         # for k in range(10):
@@ -64,6 +107,9 @@ class Algorithms:
         if not Algorithms.validate_solution(graph, best_solution):
             raise ValueError("The solution is invalid: some edges do not exist or tours are incomplete.")
 
+        # Costs were accumulated from deltas, recompute once to drop the floating point drift
+        best_cost = Algorithms.compute_total_cost(graph, best_solution)
+
         elapsed_time = time.perf_counter() - start_time
         print(f"Final solution cost: {best_cost:.2f}")
         print(f"Elapsed time: {elapsed_time:.2f} seconds")
@@ -88,27 +134,49 @@ class Algorithms:
 
             # Check if all edges in the tour exist in the graph
             for i in range(len(tour) - 1):
-                if not graph.graph.has_edge(tour[i], tour[i + 1]):
+                if not graph.has_edge(tour[i], tour[i + 1]):
                     return False
 
         return True
 
     @staticmethod
-    def initialize_solution(nodes, start_node, num_vehicles, graph):
+    def initialize_solution(nodes, start_node, num_vehicles, graph, rng=random, strategy="random"):
         """
         Initializes a solution by distributing nodes among vehicles.
         Ensures that all edges in the solution exist in the graph, even if it requires using multiple edges.
 
+        With the "random" strategy the nodes are shuffled and dealt to the vehicles in turn. With the
+        "split" strategy they are ordered with the nearest neighbor heuristic on the metric closure,
+        and this giant tour is optimally cut into one tour per vehicle (see `split_giant_tour`),
+        which gives a much better starting point.
+
         Args:
             nodes (list): List of nodes to distribute.
             start_node (any): The starting node for all vehicles.
             num_vehicles (int): Number of vehicles.
-            graph (Graph): The graph object.
+            graph (Graph or CompactGraph): The graph object. A CompactGraph must be complete for the "split" strategy.
+            rng (random.Random, optional): Source of randomness. Defaults to the global `random` module.
+            strategy (str, optional): "random" or "split". Defaults to "random".
 
         Returns:
             dict: A valid initial solution.
+
+        Raises:
+            ValueError: If the strategy is unknown or if some nodes are not connected.
         """
-        random.shuffle(nodes)
+        if strategy == "split":
+            if isinstance(graph, CompactGraph):
+                giant_tour = Algorithms.nearest_neighbor_tour(graph, start_node, nodes)
+                return Algorithms.split_giant_tour(graph, giant_tour, start_node, num_vehicles)
+            closure = graph.metric_closure()
+            depot = closure.index[start_node]
+            giant_tour = Algorithms.nearest_neighbor_tour(closure, depot, [closure.index[node] for node in nodes])
+            solution = Algorithms.split_giant_tour(closure, giant_tour, depot, num_vehicles)
+            return Algorithms.expand_solution(graph, closure.decode_solution(solution))
+        if strategy != "random":
+            raise ValueError(f"Unknown strategy: {strategy}. Use 'random' or 'split'.")
+
+        rng.shuffle(nodes)
         solution = {v: [start_node] for v in range(num_vehicles)}
 
         for i, node in enumerate(nodes):
@@ -116,12 +184,12 @@ class Algorithms:
             last_node = solution[vehicle_id][-1]
 
             # Ensure the edge exists before adding the node
-            if graph.graph.has_edge(last_node, node):
+            if graph.has_edge(last_node, node):
                 solution[vehicle_id].append(node)
             else:
                 # Find a valid path using the shortest path algorithm
                 try:
-                    path = nx.shortest_path(graph.graph, source=last_node, target=node, weight='weight')
+                    path = graph.shortest_path(last_node, node)
                     # Add the intermediate nodes to the solution
                     solution[vehicle_id].extend(path[1:])  # Exclude the last_node as it's already in the solution
                 except nx.NetworkXNoPath:
@@ -130,12 +198,12 @@ class Algorithms:
         # Complete the tour by returning to the start node
         for v in solution:
             last_node = solution[v][-1]
-            if graph.graph.has_edge(last_node, start_node):
+            if graph.has_edge(last_node, start_node):
                 solution[v].append(start_node)
             else:
                 # Find a valid path back to the start node
                 try:
-                    path = nx.shortest_path(graph.graph, source=last_node, target=start_node, weight='weight')
+                    path = graph.shortest_path(last_node, start_node)
                     solution[v].extend(path[1:])  # Exclude the last_node as it's already in the solution
                 except nx.NetworkXNoPath:
                     raise ValueError(f"No path exists between {last_node} and {start_node} in the graph.")
@@ -143,7 +211,62 @@ class Algorithms:
         return solution
 
     @staticmethod
-    def generate_neighbor_multi_vehicle(graph, solution):
+    def calibrate_temperature(graph, solution, rng=random, acceptance=INITIAL_ACCEPTANCE, samples=CALIBRATION_MOVES):
+        """
+        Computes the temperature at which the average uphill move from a solution is accepted with
+        probability `acceptance`, from a sample of random moves. The solution is left unchanged.
+
+        Args:
+            graph (Graph or CompactGraph): The graph object.
+            solution (dict): The solution to sample moves from.
+            rng (random.Random, optional): Source of randomness. Defaults to the global `random` module.
+            acceptance (float, optional): Target acceptance probability. Defaults to INITIAL_ACCEPTANCE.
+            samples (int, optional): Number of moves to sample. Defaults to CALIBRATION_MOVES.
+
+        Returns:
+            float or None: The temperature, or None if no sampled move increases the cost.
+        """
+        uphill = []
+        for _ in range(samples):
+            undo, delta = Algorithms.apply_random_move(graph, solution, rng)
+            if undo is not None:
+                Algorithms.undo_move(solution, undo)
+                if delta > 0:
+                    uphill.append(delta)
+        if not uphill:
+            return None
+        return -(sum(uphill) / len(uphill)) / math.log(acceptance)
+
+    @staticmethod
+    def expand_solution(graph, solution):
+        """
+        Expands tours whose consecutive nodes may not be adjacent (for instance tours computed on
+        `Graph.metric_closure`) into tours made of real edges, by inserting the shortest path
+        between each pair of consecutive nodes.
+
+        Args:
+            graph (Graph): The graph object.
+            solution (dict): The solution to expand, where keys are vehicle IDs and values are lists of nodes.
+
+        Returns:
+            dict: The expanded solution.
+
+        Raises:
+            ValueError: If two consecutive nodes are not connected in the graph.
+        """
+        expanded = {}
+        for vehicle_id, tour in solution.items():
+            path = tour[:1]
+            for u, v in zip(tour, tour[1:]):
+                try:
+                    path.extend(graph.shortest_path(u, v)[1:])
+                except nx.NetworkXNoPath:
+                    raise ValueError(f"No path exists between {u} and {v} in the graph.")
+            expanded[vehicle_id] = path
+        return expanded
+
+    @staticmethod
+    def generate_neighbor_multi_vehicle(graph, solution, rng=random):
         """
         Generates a neighboring solution by modifying the tours of the vehicles.
         Ensures that all edges in the solution exist in the graph.
@@ -151,44 +274,330 @@ class Algorithms:
         Args:
             graph (Graph): The graph object.
             solution (dict): The current solution.
+            rng (random.Random, optional): Source of randomness. Defaults to the global `random` module.
 
         Returns:
             dict: A neighboring solution.
         """
+        neighbor, _ = Algorithms.generate_neighbor_with_delta(graph, solution, rng)
+        return neighbor
+
+    @staticmethod
+    def generate_neighbor_with_delta(graph, solution, rng=random):
+        """
+        Generates a neighboring solution together with its cost difference to the current solution.
+        The delta is computed from the edges touched by the move only, not from the whole solution.
+
+        Args:
+            graph (Graph): The graph object.
+            solution (dict): The current solution.
+            rng (random.Random, optional): Source of randomness. Defaults to the global `random` module.
+
+        Returns:
+            tuple: (neighbor, delta)
+                - neighbor (dict): A neighboring solution (the current solution itself if the move is invalid).
+                - delta (float): Cost of the neighbor minus cost of the current solution.
+        """
         neighbor = copy.deepcopy(solution)
-        vehicle_ids = list(neighbor.keys())
 
-        move_type = random.choice(["swap_within", "move_between"])
+        undo, delta = Algorithms.apply_random_move(graph, neighbor, rng)
+        if undo is None:
+            return solution, 0  # Return the original solution if invalid
 
-        if move_type == "swap_within":
+        return neighbor, delta
+
+    @staticmethod
+    def apply_random_move(graph, solution, rng=random):
+        """
+        Draws a random move and applies it in place to the solution.
+        Moves that would break a tour (use an edge that does not exist) are not applied.
+
+        Args:
+            graph (Graph): The graph object.
+            solution (dict): The current solution, modified in place.
+            rng (random.Random, optional): Source of randomness. Defaults to the global `random` module.
+
+        Returns:
+            tuple: (undo, delta)
+                - undo (tuple or None): The undo entry to give to `undo_move`, None if no move was applied.
+                - delta (float): Cost after the move minus cost before the move, 0 if no move was applied.
+        """
+        move = Algorithms.random_move(solution, rng)
+        if move is None or not Algorithms.move_is_feasible(graph, solution, move):
+            return None, 0
+
+        delta = Algorithms.move_delta(graph, solution, move)
+        undo = Algorithms.apply_move(solution, move)
+        return undo, delta
+
+    @staticmethod
+    def move_is_feasible(graph, solution, move):
+        """
+        Checks whether a move keeps the tours valid, without applying it.
+        The solution is assumed valid: only the (at most four) edges created by the move are checked,
+        so the cost of the check does not depend on the length of the tours.
+
+        Args:
+            graph (Graph): The graph object.
+            solution (dict): The current solution, assumed valid.
+            move (tuple): A move as returned by `random_move`.
+
+        Returns:
+            bool: True if all the edges created by the move exist, False otherwise.
+        """
+        has_edge = graph.has_edge
+
+        if move[0] == "swap_within":
+            _, v, i, j = move
+            if i > j:
+                i, j = j, i
+            tour = solution[v]
+            a, b = tour[i], tour[j]
+            if not (has_edge(tour[i - 1], b) and has_edge(a, tour[j + 1])):
+                return False
+            # Adjacent positions keep the edge (a, b), otherwise the inner edges change as well
+            return j == i + 1 or (has_edge(b, tour[i + 1]) and has_edge(tour[j - 1], a))
+
+        _, v1, idx, v2, insert_pos = move
+        source_tour, target_tour = solution[v1], solution[v2]
+        node = source_tour[idx]
+        return (has_edge(source_tour[idx - 1], source_tour[idx + 1])
+                and has_edge(target_tour[insert_pos - 1], node)
+                and has_edge(node, target_tour[insert_pos]))
+
+    @staticmethod
+    def apply_move(solution, move):
+        """
+        Applies a move in place to the solution.
+
+        Args:
+            solution (dict): The solution to modify.
+            move (tuple): A move as returned by `random_move`.
+
+        Returns:
+            tuple: The undo entry of the move, to give to `undo_move` to restore the solution.
+        """
+        if move[0] == "swap_within":
             # Swap two nodes within the same vehicle's tour
-            v = random.choice(vehicle_ids)
-            if len(neighbor[v]) > 3:  # At least two real nodes
-                i, j = random.sample(range(1, len(neighbor[v]) - 1), 2)
-                neighbor[v][i], neighbor[v][j] = neighbor[v][j], neighbor[v][i]
+            _, v, i, j = move
+            tour = solution[v]
+            tour[i], tour[j] = tour[j], tour[i]
+        else:  # move_between
+            _, v1, idx, v2, insert_pos = move
+            solution[v2].insert(insert_pos, solution[v1].pop(idx))
+
+        # A move is its own undo entry, `undo_move` knows how to revert it
+        return move
 
-                # Ensure the modified path is valid
-                for k in range(len(neighbor[v]) - 1):
-                    if not graph.graph.has_edge(neighbor[v][k], neighbor[v][k + 1]):
-                        return solution  # Return the original solution if invalid
+    @staticmethod
+    def undo_move(solution, undo):
+        """
+        Reverts in place a move applied with `apply_move`.
+        Several moves must be undone in the reverse order they were applied.
 
+        Args:
+            solution (dict): The solution to restore.
+            undo (tuple): The undo entry returned by `apply_move`.
+        """
+        if undo[0] == "swap_within":
+            _, v, i, j = undo
+            tour = solution[v]
+            tour[i], tour[j] = tour[j], tour[i]
         else:  # move_between
-            v1, v2 = random.sample(vehicle_ids, 2)
-            if len(neighbor[v1]) > 2:
-                idx = random.randint(1, len(neighbor[v1]) - 2)
-                node = neighbor[v1].pop(idx)
-                insert_pos = random.randint(1, len(neighbor[v2]) - 1)
-                neighbor[v2].insert(insert_pos, node)
-
-                # Ensure the modified paths are valid
-                for k in range(len(neighbor[v1]) - 1):
-                    if not graph.graph.has_edge(neighbor[v1][k], neighbor[v1][k + 1]):
-                        return solution  # Return the original solution if invalid
-                for k in range(len(neighbor[v2]) - 1):
-                    if not graph.graph.has_edge(neighbor[v2][k], neighbor[v2][k + 1]):
-                        return solution  # Return the original solution if invalid
+            _, v1, idx, v2, insert_pos = undo
+            solution[v1].insert(idx, solution[v2].pop(insert_pos))
 
-        return neighbor
+    @staticmethod
+    def modified_vehicles(move):
+        """
+        Returns the vehicles whose tour is modified by a move.
+
+        Args:
+            move (tuple): A move as returned by `random_move`.
+
+        Returns:
+            tuple: The IDs of the modified vehicles.
+        """
+        if move[0] == "swap_within":
+            return (move[1],)
+        return (move[1], move[3])
+
+    @staticmethod
+    def copy_solution(solution):
+        """
+        Copies a solution, tour by tour. Nodes are immutable so no deep copy is needed.
+
+        Args:
+            solution (dict): The solution to copy.
+
+        Returns:
+            dict: A copy of the solution.
+        """
+        return {vehicle_id: list(tour) for vehicle_id, tour in solution.items()}
+
+    @staticmethod
+    def metropolis_steps(graph, solution, temp, moves, rng, current_cost, best_solution, best_cost,
+                         best_is_current, debug=False):
+        """
+        Tries `moves` random moves at a fixed temperature with the Metropolis criterion: improving moves
+        are always accepted, the others with probability exp(-delta / temp). This is the inner loop shared
+        by the annealing solvers (`anytime.AnnealingSolver` and the replicas of `parallel.parallel_tempering`).
+
+        The solution is modified in place. The best solution is only copied when an accepted move leaves it,
+        so while `best_is_current` is True the best solution is the current one and `best_solution` is stale.
+
+        Args:
+            graph (CompactGraph): The graph, with integer node IDs.
+            solution (dict): The current solution, modified in place.
+            temp (float): The temperature.
+            moves (int): Number of moves to draw.
+            rng (random.Random): Source of randomness.
+            current_cost (float): Cost of `solution`.
+            best_solution (dict or None): The best solution, if it is not the current one.
+            best_cost (float): Cost of the best solution.
+            best_is_current (bool): Whether the current solution is the best one.
+            debug (bool, optional): Validate the solution after each accepted move. Defaults to False.
+
+        Returns:
+            tuple: (best_solution, current_cost, best_cost, best_is_current, tried, accepted), the updated
+                   state and the numbers of valid and of accepted moves.
+        """
+        tried = accepted = 0
+        for _ in range(moves):
+            undo, delta = Algorithms.apply_random_move(graph, solution, rng)
+            if undo is None:
+                continue
+            tried += 1
+            if delta < 0 or rng.random() < math.exp(-delta / temp):
+                accepted += 1
+                if best_is_current and delta >= 0:
+                    # Leaving the best solution: save it before going on
+                    Algorithms.undo_move(solution, undo)
+                    best_solution = Algorithms.copy_solution(solution)
+                    Algorithms.apply_move(solution, undo)
+                    best_is_current = False
+
+                current_cost += delta
+                if current_cost < best_cost:
+                    best_cost = current_cost
+                    best_is_current = True
+
+                if debug:
+                    assert Algorithms.validate_solution(graph, solution), "A move broke the solution"
+            else:
+                Algorithms.undo_move(solution, undo)
+        return best_solution, current_cost, best_cost, best_is_current, tried, accepted
+
+    @staticmethod
+    def random_move(solution, rng=random):
+        """
+        Draws a random move for the solution without applying it.
+
+        Args:
+            solution (dict): The current solution.
+            rng (random.Random, optional): Source of randomness. Defaults to the global `random` module.
+
+        Returns:
+            tuple or None: The move, either ("swap_within", v, i, j) or ("move_between", v1, idx, v2, insert_pos),
+                           or None if the drawn move cannot be applied to the solution.
+        """
+        vehicle_ids = list(solution.keys())
+
+        move_type = rng.choice(["swap_within", "move_between"])
+
+        if move_type == "swap_within":
+            v = rng.choice(vehicle_ids)
+            if len(solution[v]) > 3:  # At least two real nodes
+                i, j = rng.sample(range(1, len(solution[v]) - 1), 2)
+                return ("swap_within", v, i, j)
+        else:  # move_between
+            v1, v2 = rng.sample(vehicle_ids, 2)
+            if len(solution[v1]) > 2:
+                idx = rng.randint(1, len(solution[v1]) - 2)
+                insert_pos = rng.randint(1, len(solution[v2]) - 1)
+                return ("move_between", v1, idx, v2, insert_pos)
+
+        return None
+
+    @staticmethod
+    def move_delta(graph, solution, move):
+        """
+        Computes the cost difference a move would cause, without applying it.
+
+        Args:
+            graph (Graph): The graph object.
+            solution (dict): The current solution.
+            move (tuple): A move as returned by `random_move`.
+
+        Returns:
+            float: Cost after the move minus cost before the move.
+        """
+        if move[0] == "swap_within":
+            _, v, i, j = move
+            return Algorithms.swap_within_delta(graph, solution[v], i, j)
+
+        _, v1, idx, v2, insert_pos = move
+        return Algorithms.move_between_delta(graph, solution[v1], idx, solution[v2], insert_pos)
+
+    @staticmethod
+    def swap_within_delta(graph, tour, i, j):
+        """
+        Computes the cost difference of swapping the nodes at positions `i` and `j` of a tour.
+        Only the (at most four) edges around the two positions are evaluated.
+
+        Args:
+            graph (Graph): The graph object.
+            tour (list): The tour of the vehicle, starting and ending at the depot.
+            i (int): Position of the first node, between 1 and len(tour) - 2.
+            j (int): Position of the second node, between 1 and len(tour) - 2.
+
+        Returns:
+            float: Cost after the swap minus cost before the swap.
+        """
+        if i == j:
+            return 0
+        if i > j:
+            i, j = j, i
+
+        weight = graph.get_edge_weight
+        a, b = tour[i], tour[j]
+        prev_a, next_b = tour[i - 1], tour[j + 1]
+
+        if j == i + 1:
+            # Adjacent positions: the edge (a, b) is kept, only the outer edges change
+            return weight(prev_a, b) + weight(a, next_b) - weight(prev_a, a) - weight(b, next_b)
+
+        next_a, prev_b = tour[i + 1], tour[j - 1]
+        removed = weight(prev_a, a) + weight(a, next_a) + weight(prev_b, b) + weight(b, next_b)
+        added = weight(prev_a, b) + weight(b, next_a) + weight(prev_b, a) + weight(a, next_b)
+        return added - removed
+
+    @staticmethod
+    def move_between_delta(graph, source_tour, idx, target_tour, insert_pos):
+        """
+        Computes the cost difference of moving the node at `idx` of a tour into another tour.
+        Only the edges around the removed node and around the insertion point are evaluated.
+
+        Args:
+            graph (Graph): The graph object.
+            source_tour (list): The tour the node is removed from.
+            idx (int): Position of the node in `source_tour`, between 1 and len(source_tour) - 2.
+            target_tour (list): The tour the node is inserted into.
+            insert_pos (int): Position of the node in `target_tour` after insertion,
+                              between 1 and len(target_tour) - 1.
+
+        Returns:
+            float: Cost after the move minus cost before the move.
+        """
+        weight = graph.get_edge_weight
+        node = source_tour[idx]
+        prev_node, next_node = source_tour[idx - 1], source_tour[idx + 1]
+        removal = weight(prev_node, next_node) - weight(prev_node, node) - weight(node, next_node)
+
+        before, after = target_tour[insert_pos - 1], target_tour[insert_pos]
+        insertion = weight(before, node) + weight(node, after) - weight(before, after)
+
+        return removal + insertion
 
     @staticmethod
     def compute_total_cost(graph, solution):
@@ -201,6 +610,66 @@ class Algorithms:
                 total_cost += graph.get_edge_weight(tour[i], tour[i + 1])
         return total_cost
     
+    @staticmethod
+    def compute_total_costs(graph, solutions):
+        """
+        Calculates the total cost of several solutions at once: the edges of all the tours are
+        gathered into index arrays and their weights are looked up in a single vectorized call.
+
+        Args:
+            graph (Graph or CompactGraph): The graph object.
+            solutions (list): The solutions, as dictionaries of tours (of integer IDs for a CompactGraph).
+
+        Returns:
+            numpy.ndarray: The total cost of each solution.
+        """
+        if isinstance(graph, CompactGraph):
+            compact, index = graph, None
+        else:
+            compact = graph.compact()
+            index = compact.index
+        sources, targets, owners = [], [], []
+        for k, solution in enumerate(solutions):
+            for tour in solution.values():
+                ids = tour if index is None else [index[node] for node in tour]
+                sources.extend(ids[:-1])
+                targets.extend(ids[1:])
+                owners.extend([k] * (len(ids) - 1))
+
+        weights = compact.get_edge_weights(sources, targets)
+        return np.bincount(np.asarray(owners, dtype=np.int64), weights=weights, minlength=len(solutions))
+
+    @staticmethod
+    def compute_hourly_costs(graph, solution):
+        """
+        Calculates the cost of a solution at every hour of the day, from the `traffic` profile of the
+        graph: the edges of the tours are looked up once and their 24 weights are read from the
+        multiplier table, without building a graph per hour.
+
+        Args:
+            graph (Graph): The graph object, with a `traffic` profile.
+            solution (dict): Keys are vehicle IDs and values are tours of node names.
+
+        Returns:
+            numpy.ndarray: The cost at each hour, inf at the hours where a tour uses a blocked edge.
+
+        Raises:
+            ValueError: If the graph has no traffic profile.
+        """
+        profile = graph.traffic
+        if profile is None:
+            raise ValueError("The graph has no traffic profile.")
+        sources, targets = [], []
+        for tour in solution.values():
+            sources.extend(tour[:-1])
+            targets.extend(tour[1:])
+
+        index = graph.compact().index
+        weights = graph.compact().get_edge_weights([index[u] for u in sources], [index[v] for v in targets])
+        rows = profile.edge_ids([profile.index[u] for u in sources], [profile.index[v] for v in targets])
+        hourly = profile.weights_at(weights, rows)
+        return np.where((hourly < 0).any(axis=0), np.inf, hourly.sum(axis=0))
+
     @staticmethod
     def optimize_truck_loads(num_packages, truck_capacity):
         """
@@ -230,9 +699,31 @@ class Algorithms:
         return packages_per_truck
     
     @staticmethod
-    def genetic_algorithm(graph, population_size, generations, mutation_rate, num_vehicles):
+    def genetic_algorithm(graph, population_size, generations, mutation_rate, num_vehicles, debug=False,
+                          workers=1, seed=None, crossover="tours", local_search_rate=0.0, polish=False):
         """
         Genetic algorithm for the multi-vehicle TSP problem.
+        Offspring are valid by construction, so they are not validated again.
+
+        By default (`crossover="tours"`) individuals are solutions, each tour of an offspring is copied
+        from one of its parents and the missing nodes are added with shortest paths (see `crossover`).
+        With a permutation crossover ("ox", "pmx" or "erx", see `GIANT_TOUR_CROSSOVERS`) individuals are
+        giant tours instead: permutations of all the nodes but the depot, on `Graph.metric_closure`, mutated
+        by swapping two nodes and optimally cut into one tour per vehicle by `split_giant_tour`. Offspring
+        keep a size of n and each crossover is O(n), which converges much faster, but the dense n x n
+        metric closure must be built first (O(n^2) memory), so this is best suited to graphs of a few
+        thousand nodes. The best individual is expanded back into paths of real edges at the end.
+
+        In giant tour mode, a `local_search_rate` fraction of the offspring is also improved by a
+        `LocalSearch` (a memetic mutation). With `polish=True` the best solution is improved by
+        `local_search` at the end.
+
+        The search itself is an `anytime.GeneticSolver`, which can be used directly to read the best
+        solution between two generations, or to stop it and resume it later.
+
+        With `workers` > 1 the offspring of each generation are built on a process pool (see
+        `parallel.OffspringPool`), the graph being sent once to each worker. Each offspring gets its
+        own seed drawn from `seed`, so the result does not depend on the number of workers.
 
         Args:
             graph (Graph): The graph object.
@@ -240,122 +731,640 @@ class Algorithms:
             generations (int): Number of generations to evolve.
             mutation_rate (float): Probability of mutation.
             num_vehicles (int): Number of vehicles.
+            debug (bool, optional): Validate the whole population at each generation. Defaults to False.
+            workers (int, optional): Number of worker processes building the offspring. Defaults to 1 (no pool).
+            seed (int, optional): Seed of the run, the global `random` state is used if None. Defaults to None.
+            crossover (str, optional): "tours", "ox", "pmx" or "erx". Defaults to "tours".
+            local_search_rate (float, optional): Probability for an offspring to be improved by local search,
+                                                 in giant tour mode. Defaults to 0.
+            polish (bool, optional): Improve the best solution with `local_search`. Defaults to False.
 
         Returns:
             tuple: (best_solution, best_cost)
+
+        Raises:
+            ValueError: If the crossover is unknown.
         """
-        def initialize_population():
-            """Initializes the population with random valid solutions."""
-            population = []
-            for _ in range(population_size):
-                nodes = list(graph.graph.nodes)
-                start_node = random.choice(nodes)
-                nodes.remove(start_node)
-                random.shuffle(nodes)  # Shuffle nodes for diversity
-                solution = Algorithms.initialize_solution(nodes, start_node, num_vehicles, graph)
-                population.append(solution)
-            return population
-
-        def fitness(solution):
-            """Calculates the fitness of a solution (lower cost is better)."""
-            return 1 / (1 + Algorithms.compute_total_cost(graph, solution))
-
-        def select_parents(population):
-            """Selects two parents using a roulette wheel selection."""
-            fitness_values = [fitness(ind) for ind in population]
-            total_fitness = sum(fitness_values)
-            probabilities = [f / total_fitness for f in fitness_values]
-            parents = random.choices(population, weights=probabilities, k=2)
-            return parents
-
-        def crossover(parent1, parent2):
-            """Performs crossover between two parents to produce an offspring."""
-            offspring = {}
-            for vehicle_id in parent1.keys():
-                if random.random() < 0.5:
-                    offspring[vehicle_id] = parent1[vehicle_id]
-                else:
-                    offspring[vehicle_id] = parent2[vehicle_id]
-
-            # Ensure all nodes are covered and vehicles return to their start
-            all_nodes = set(graph.graph.nodes)
-            covered_nodes = set(node for tour in offspring.values() for node in tour)
-            missing_nodes = all_nodes - covered_nodes
-
-            # Distribute missing nodes among vehicles
-            for node in missing_nodes:
-                vehicle_id = random.choice(list(offspring.keys()))
-                last_node = offspring[vehicle_id][-1]
-                if graph.graph.has_edge(last_node, node):
-                    offspring[vehicle_id].append(node)
-                else:
-                    # Find a valid path to the node
-                    path = nx.shortest_path(graph.graph, source=last_node, target=node, weight='weight')
-                    offspring[vehicle_id].extend(path[1:])
-
-            # Ensure each vehicle returns to its start node
-            for vehicle_id, tour in offspring.items():
-                if tour[0] != tour[-1]:
-                    last_node = tour[-1]
-                    start_node = tour[0]
-                    if graph.graph.has_edge(last_node, start_node):
-                        tour.append(start_node)
-                    else:
-                        # Find a valid path back to the start node
-                        path = nx.shortest_path(graph.graph, source=last_node, target=start_node, weight='weight')
-                        tour.extend(path[1:])
-
-            return offspring
-
-        def mutate(solution):
-            """Mutates a solution by swapping nodes or moving nodes between vehicles."""
-            if random.random() < mutation_rate:
-                neighbor = Algorithms.generate_neighbor_multi_vehicle(graph, solution)
-                if Algorithms.validate_solution(graph, neighbor):
-                    return neighbor
-            return solution
-
-        def validate_population(population):
-            """Ensures all solutions in the population are valid."""
-            return [ind for ind in population if Algorithms.validate_solution(graph, ind)]
-
-        # Initialize population
-        population = initialize_population()
-
-        # Evolve population over generations
-        best_solution = None
-        best_cost = float('inf')
-
-        for generation in range(generations):
-            new_population = []
-
-            for _ in range(population_size):
-                # Select parents
-                parent1, parent2 = select_parents(population)
-
-                # Perform crossover
-                offspring = crossover(parent1, parent2)
-
-                # Perform mutation
-                offspring = mutate(offspring)
-
-                # Add offspring to the new population
-                new_population.append(offspring)
-
-            # Validate the new population
-            population = validate_population(new_population)
-
-            # Update the best solution
-            for individual in population:
-                cost = Algorithms.compute_total_cost(graph, individual)
-                if cost < best_cost:
-                    best_solution = individual
-                    best_cost = cost
+        # Imported here, the anytime module depends on this one
+        from anytime import GeneticSolver
 
-            #print(f"Generation {generation + 1}: Best cost = {best_cost:.2f}")
+        with GeneticSolver(graph, population_size, generations, mutation_rate, num_vehicles, debug, workers, seed,
+                           crossover, local_search_rate) as solver:
+            best_solution, best_cost = solver.run()
+        if solver.giant_tours:
+            best_cost = Algorithms.compute_total_cost(graph, best_solution)
+        if polish:
+            best_solution = Algorithms.local_search(graph, best_solution)
+            best_cost = Algorithms.compute_total_cost(graph, best_solution)
 
         # Update tsp_path in the graph with the best solution
         for vehicle_id, path in best_solution.items():
             graph.set_tsp_path(vehicle_id, path)
 
-        return best_solution, best_cost
\ No newline at end of file
+        return best_solution, best_cost
+
+    @staticmethod
+    def local_search(graph, solution, num_neighbors=10, max_moves=None):
+        """
+        Improves a solution with 2-opt, Or-opt, relocate and exchange moves (see `LocalSearch`),
+        on the metric closure of the graph, until it is a local optimum.
+        Nodes visited several times (passing through) are only kept at their first visit, then the
+        tours are expanded back into paths of real edges: on a metric this never increases the cost.
+
+        Args:
+            graph (Graph or CompactGraph): The graph object. A CompactGraph must be complete and the
+                                           solution is then improved on it directly.
+            solution (dict): The solution, where keys are vehicle IDs and values are lists of nodes.
+            num_neighbors (int, optional): Size of the candidate lists. Defaults to 10.
+            max_moves (int, optional): Maximum number of moves to apply. Defaults to None (no limit).
+
+        Returns:
+            dict: The improved solution.
+        """
+        if isinstance(graph, CompactGraph):
+            return LocalSearch(graph, num_neighbors).improve(solution, max_moves)[0]
+
+        closure = graph.metric_closure()
+        routes = Algorithms.closure_routes(closure, solution)
+        improved, _ = LocalSearch(closure, num_neighbors).improve(routes, max_moves)
+        return Algorithms.expand_solution(graph, closure.decode_solution(improved))
+
+    @staticmethod
+    def closure_routes(closure, solution):
+        """
+        Converts a solution into tours of the metric closure of the graph: nodes visited several times
+        (passing through) are only kept at their first visit. On a metric this never increases the cost.
+
+        Args:
+            closure (CompactGraph): The metric closure, see `Graph.metric_closure`.
+            solution (dict): The solution, where keys are vehicle IDs and values are lists of nodes.
+
+        Returns:
+            dict: The tours, as lists of integer IDs of the closure.
+        """
+        index = closure.index
+        visited = set()
+        routes = {}
+        for vehicle_id, tour in solution.items():
+            depot = index[tour[0]]
+            route = [depot]
+            for node in tour[1:-1]:
+                i = index[node]
+                if i != depot and i not in visited:
+                    visited.add(i)
+                    route.append(i)
+            route.append(depot)
+            routes[vehicle_id] = route
+        return routes
+
+    @staticmethod
+    def reoptimize(graph, changed_edges, solution=None, num_neighbors=10, max_moves=None):
+        """
+        Updates a solution after edge weights changed (for instance after `contraints.shuffle_graph`),
+        without solving the problem again. Only the tours using one of the changed edges are modified:
+        their nodes are reconnected by shortest paths with the new weights (so blocked edges are avoided),
+        then improved together by `LocalSearch` on the metric closure of their nodes only, which takes a
+        few Dijkstra runs instead of the closure of the whole graph.
+
+        Args:
+            graph (Graph): The graph object, with the new weights.
+            changed_edges (iterable): The (u, v) edges whose weight changed.
+            solution (dict, optional): The solution to update. Defaults to `graph.tsp_paths`.
+            num_neighbors (int, optional): Size of the candidate lists of the local search. Defaults to 10.
+            max_moves (int, optional): Maximum number of local search moves. Defaults to None (no limit).
+
+        Returns:
+            dict: The updated solution, also stored in `graph.tsp_paths`.
+
+        Raises:
+            ValueError: If blocked edges disconnect nodes of the modified tours.
+        """
+        solution = dict(graph.tsp_paths if solution is None else solution)
+        changed = {frozenset(edge) for edge in changed_edges}
+        affected = [
+            vehicle_id for vehicle_id, tour in solution.items()
+            if any(frozenset(edge) in changed for edge in zip(tour, tour[1:]))
+        ]
+
+        if affected:
+            compact = graph.compact()
+            oracle = graph.shortest_paths()
+            routes = Algorithms.closure_routes(compact, {vehicle_id: solution[vehicle_id] for vehicle_id in affected})
+            members = sorted({i for route in routes.values() for i in route})
+            distances = np.array([oracle.distances_from(i)[members] for i in members])
+            if not np.isfinite(distances).all():
+                raise ValueError("Blocked edges disconnect nodes of the modified tours.")
+            np.fill_diagonal(distances, np.nan)
+
+            # Complete graph over the nodes of the modified tours, whose names are their IDs in `compact`
+            closure = CompactGraph(members, matrix=distances)
+            improved, _ = LocalSearch(closure, num_neighbors).improve(closure.encode_solution(routes), max_moves)
+            repaired = compact.decode_solution(closure.decode_solution(improved))
+            solution.update(Algorithms.expand_solution(graph, repaired))
+
+        for vehicle_id, path in solution.items():
+            graph.set_tsp_path(vehicle_id, path)
+        return solution
+
+    @staticmethod
+    def mip_solve(graph, num_vehicles, initial_solution=None, depot=None, time_limit=60, msg=False):
+        """
+        Solves the multi-vehicle TSP problem with a mixed integer program and the CBC solver bundled with PuLP,
+        to get optimal solutions on small graphs, or a lower bound telling how far heuristic solutions are from them.
+
+        The program works on the metric closure of the graph (see `Graph.metric_closure`) with the symmetric
+        two-index formulation: each node has two tour edges and the depot two per vehicle. Every vehicle visits
+        at least one node (if there are enough nodes), like with the "split" initial solutions. Subtour
+        elimination constraints are only added once the program returns a solution violating them, and the
+        program is solved again (PuLP gives no access to CBC callbacks). Each of these programs is a relaxation
+        of the problem, so their bounds are lower bounds of the optimal cost.
+
+        The solver is warm started from `initial_solution` (for instance the result of `simulated_annealing`
+        or `genetic_algorithm`), or from a "split" initial solution, which is returned if nothing better is found.
+
+        Args:
+            graph (Graph): The graph object.
+            num_vehicles (int): Number of vehicles.
+            initial_solution (dict, optional): A valid solution, whose depot is used. Defaults to None.
+            depot (hashable, optional): The depot when there is no initial solution. Defaults to the first node.
+            time_limit (float, optional): Maximum duration of the whole solve, in seconds. Defaults to 60.
+            msg (bool, optional): Displays the solver log. Defaults to False.
+
+        Returns:
+            tuple: (solution, report)
+                - solution (dict): The best solution found, made of real edges.
+                - report (dict): "cost" of the solution, "lower_bound" of the optimal cost, relative "gap"
+                  between them, "optimal" (True if the solution is proven optimal), "rounds" (number of
+                  programs solved) and "elapsed_time".
+        """
+        start_time = time.perf_counter()
+        closure = graph.metric_closure()
+        if initial_solution is None:
+            depot = depot if depot is not None else next(iter(graph.get_nodes()))
+            nodes = [node for node in graph.get_nodes() if node != depot]
+            initial_solution = Algorithms.initialize_solution(nodes, depot, num_vehicles, graph, strategy="split")
+        best_routes = Algorithms.closure_routes(closure, initial_solution)
+        best_cost = Algorithms.compute_total_cost(closure, best_routes)
+        vehicles = list(best_routes)
+        depot = best_routes[vehicles[0]][0]
+        customers = [i for i in range(closure.number_of_nodes()) if i != depot]
+        num_tours = min(num_vehicles, len(customers))
+
+        # x: edges between two nodes, y: edges between the depot and a node (2 for a tour visiting only it)
+        matrix = closure.matrix
+        problem = pulp.LpProblem("multi_vehicle_tsp", pulp.LpMinimize)
+        x = {(i, j): problem.add_variable(f"x_{i}_{j}", cat="Binary")
+             for a, i in enumerate(customers) for j in customers[a + 1:]}
+        y = {i: problem.add_variable(f"y_{i}", 0, 2, cat="Integer") for i in customers}
+        problem += (pulp.lpSum(matrix[i, j] * var for (i, j), var in x.items())
+                    + pulp.lpSum(matrix[depot, i] * var for i, var in y.items()))
+        incident = {i: [var] for i, var in y.items()}
+        for (i, j), var in x.items():
+            incident[i].append(var)
+            incident[j].append(var)
+        for i in customers:
+            problem += pulp.lpSum(incident[i]) == 2
+        problem += pulp.lpSum(y.values()) == 2 * num_tours
+
+        lower_bound = 0.0
+        optimal = not customers
+        rounds = 0
+        with tempfile.TemporaryDirectory() as directory:
+            log_path = os.path.join(directory, "cbc.log")
+            while not optimal:
+                remaining = time_limit - (time.perf_counter() - start_time)
+                if remaining <= 0:
+                    break
+
+                # Warm start from the best solution, still feasible since cuts are valid inequalities
+                for var in itertools.chain(x.values(), y.values()):
+                    var.setInitialValue(0)
+                for route in best_routes.values():
+                    for u, v in zip(route, route[1:]):
+                        if u == v:
+                            continue  # Idle vehicle
+                        if u == depot or v == depot:
+                            var = y[v if u == depot else u]
+                            var.setInitialValue((var.varValue or 0) + 1)
+                        else:
+                            x[min(u, v), max(u, v)].setInitialValue(1)
+
+                problem.solve(Algorithms._cbc_solver(msg=msg, timeLimit=remaining, warmStart=True, logPath=log_path))
+                rounds += 1
+                solved = problem.sol_status == pulp.LpSolutionOptimal
+                if solved:
+                    bound = pulp.value(problem.objective)
+                else:
+                    with open(log_path) as log:
+                        bound = Algorithms._cbc_lower_bound(log.read(), lower_bound)
+                lower_bound = max(lower_bound, bound)
+                if problem.sol_status not in (pulp.LpSolutionOptimal, pulp.LpSolutionIntegerFeasible):
+                    break
+
+                tours, subtours = Algorithms._read_mip_tours(x, y, depot, customers)
+                if subtours:
+                    for subtour in subtours:
+                        members = sorted(subtour)
+                        problem += pulp.lpSum(x[i, j] for a, i in enumerate(members) for j in members[a + 1:]) \
+                            <= len(members) - 1
+                    continue
+
+                # With more vehicles than customers, the last vehicles stay at the depot
+                routes = {vehicle_id: [depot, depot] for vehicle_id in vehicles}
+                routes.update(zip(vehicles, tours))
+                cost = Algorithms.compute_total_cost(closure, routes)
+                if cost < best_cost:
+                    best_routes, best_cost = routes, cost
+                optimal = solved
+
+        if optimal:
+            lower_bound = best_cost
+        solution = Algorithms.expand_solution(graph, closure.decode_solution(best_routes))
+        cost = Algorithms.compute_total_cost(graph, solution)
+        report = {
+            "cost": cost,
+            "lower_bound": min(lower_bound, cost),
+            "gap": (cost - min(lower_bound, cost)) / cost if cost > 0 else 0.0,
+            "optimal": optimal,
+            "rounds": rounds,
+            "elapsed_time": time.perf_counter() - start_time,
+        }
+        return solution, report
+
+    @staticmethod
+    def _cbc_solver(**options):
+        """
+        Creates a CBC solver for PuLP, using the cbc found in the PATH (installed by `pip install pulp[cbc]`)
+        or else the binary bundled with PuLP 3, without going through the deprecated PULP_CBC_CMD.
+
+        Args:
+            **options: Options of `pulp.COIN_CMD`.
+
+        Returns:
+            pulp.COIN_CMD: The solver.
+        """
+        solver = pulp.COIN_CMD(**options)
+        bundled = getattr(getattr(pulp, "PULP_CBC_CMD", None), "pulp_cbc_path", None)
+        if not solver.available() and bundled is not None:
+            solver = pulp.COIN_CMD(path=bundled, **options)
+        return solver
+
+    @staticmethod
+    def _cbc_lower_bound(log, default=0.0):
+        """
+        Reads the lower bound of a stopped solve in a CBC log. PuLP only reports the objective of the
+        incumbent, the bound proven by the branch and bound is only printed in the log.
+
+        Args:
+            log (str): The content of the CBC log.
+            default (float, optional): The bound returned when the log has none. Defaults to 0.
+
+        Returns:
+            float: The lower bound.
+        """
+        found = re.search(r"^Lower bound:\s*(\S+)", log, re.MULTILINE)
+        return float(found.group(1)) if found else default
+
+    @staticmethod
+    def _read_mip_tours(x, y, depot, customers):
+        """
+        Reads the tours of an integer solution of `mip_solve`.
+
+        Returns:
+            tuple: (tours, subtours), the tours through the depot and the sets of nodes of the cycles not
+                   going through the depot.
+        """
+        neighbors = {i: [] for i in customers}
+        for (i, j), var in x.items():
+            if var.varValue > 0.5:
+                neighbors[i].append(j)
+                neighbors[j].append(i)
+        for i, var in y.items():
+            neighbors[i].extend([depot] * round(var.varValue))
+
+        def follow(start, previous, end):
+            """Walks along the edges from `start`, coming from `previous`, until reaching `end`."""
+            path = []
+            node = start
+            while True:
+                path.append(node)
+                seen.add(node)
+                a, b = neighbors[node]
+                previous, node = node, (b if a == previous else a)
+                if node == end:
+                    return path
+
+        seen = set()
+        tours = [[depot] + follow(i, depot, depot) + [depot]
+                 for i in customers if i not in seen and depot in neighbors[i]]
+        subtours = [set(follow(i, None, i)) for i in customers if i not in seen]
+        return tours, subtours
+
+    @staticmethod
+    def make_offspring(graph, parent1, parent2, mutation_rate, crossover="tours", rng=random):
+        """
+        Builds one offspring of the genetic algorithm: crossover, then mutation.
+
+        Args:
+            graph (Graph): The graph object, only used by the "tours" crossover.
+            parent1 (dict or list): The first parent, a solution or a giant tour.
+            parent2 (dict or list): The second parent, of the same kind.
+            mutation_rate (float): Probability of mutation.
+            crossover (str, optional): "tours" or a key of `GIANT_TOUR_CROSSOVERS`. Defaults to "tours".
+            rng (random.Random, optional): Source of randomness. Defaults to the global `random` module.
+
+        Returns:
+            dict or list: The offspring.
+        """
+        if crossover == "tours":
+            return Algorithms.mutate(graph, Algorithms.crossover(graph, parent1, parent2, rng), mutation_rate, rng)
+
+        child = getattr(Algorithms, GIANT_TOUR_CROSSOVERS[crossover])(parent1, parent2, rng)
+        if rng.random() < mutation_rate and len(child) > 1:
+            # Any permutation is a valid giant tour, swap two nodes
+            i, j = rng.sample(range(len(child)), 2)
+            child[i], child[j] = child[j], child[i]
+        return child
+
+    @staticmethod
+    def order_crossover(parent1, parent2, rng=random):
+        """
+        Order crossover (OX) of two giant tours, in O(n).
+        The offspring keeps a random segment of `parent1` in place, the other nodes are placed in
+        the order they appear in `parent2`, starting after the segment.
+
+        Args:
+            parent1 (list): The first giant tour.
+            parent2 (list): The second giant tour, a permutation of the same nodes.
+            rng (random.Random, optional): Source of randomness. Defaults to the global `random` module.
+
+        Returns:
+            list: The offspring.
+        """
+        n = len(parent1)
+        if n < 2:
+            return list(parent1)
+        a, b = sorted(rng.sample(range(n + 1), 2))
+        child = [None] * n
+        child[a:b] = parent1[a:b]
+        kept = set(parent1[a:b])
+
+        position = b % n
+        for k in range(n):
+            node = parent2[(b + k) % n]
+            if node not in kept:
+                child[position] = node
+                position = (position + 1) % n
+        return child
+
+    @staticmethod
+    def partially_mapped_crossover(parent1, parent2, rng=random):
+        """
+        Partially mapped crossover (PMX) of two giant tours.
+        The offspring keeps a random segment of `parent1` in place and the other positions of `parent2`;
+        the nodes of `parent2` that clash with the segment are replaced by following the mapping of the segment.
+
+        Args:
+            parent1 (list): The first giant tour.
+            parent2 (list): The second giant tour, a permutation of the same nodes.
+            rng (random.Random, optional): Source of randomness. Defaults to the global `random` module.
+
+        Returns:
+            list: The offspring.
+        """
+        n = len(parent1)
+        if n < 2:
+            return list(parent1)
+        a, b = sorted(rng.sample(range(n + 1), 2))
+        child = list(parent2)
+        child[a:b] = parent1[a:b]
+
+        # Maps each node of the segment of parent1 to the node of parent2 at the same position
+        mapping = {parent1[k]: parent2[k] for k in range(a, b)}
+        for k in list(range(a)) + list(range(b, n)):
+            node = parent2[k]
+            while node in mapping:
+                node = mapping[node]
+            child[k] = node
+        return child
+
+    @staticmethod
+    def edge_recombination_crossover(parent1, parent2, rng=random):
+        """
+        Edge recombination crossover (ERX) of two giant tours, in O(n).
+        The offspring is built node by node, going whenever possible to a neighbor of the current
+        node in one of the parents, the one with the fewest remaining neighbors first.
+
+        Args:
+            parent1 (list): The first giant tour.
+            parent2 (list): The second giant tour, a permutation of the same nodes.
+            rng (random.Random, optional): Source of randomness. Defaults to the global `random` module.
+
+        Returns:
+            list: The offspring.
+        """
+        n = len(parent1)
+        if n < 2:
+            return list(parent1)
+
+        # Union of the neighbors of each node in both parents, seen as cycles
+        neighbors = {node: set() for node in parent1}
+        for parent in (parent1, parent2):
+            for k, node in enumerate(parent):
+                neighbors[node].add(parent[k - 1])
+                neighbors[node].add(parent[(k + 1) % n])
+
+        # Nodes not placed yet, with their position in the list for O(1) removals
+        remaining = list(parent1)
+        position = {node: k for k, node in enumerate(remaining)}
+
+        def remove(node):
+            last = remaining.pop()
+            if last != node:
+                k = position[node]
+                remaining[k] = last
+                position[last] = k
+            del position[node]
+            for neighbor in neighbors[node]:
+                neighbors[neighbor].discard(node)
+
+        node = parent1[0]
+        child = []
+        while True:
+            child.append(node)
+            remove(node)
+            if not remaining:
+                return child
+            candidates = neighbors[node]
+            if candidates:
+                fewest = min(len(neighbors[candidate]) for candidate in candidates)
+                node = rng.choice(sorted(c for c in candidates if len(neighbors[c]) == fewest))
+            else:
+                node = remaining[rng.randrange(len(remaining))]
+
+    @staticmethod
+    def split_giant_tour(graph, giant_tour, depot, num_vehicles, max_route_size=None):
+        """
+        Optimally cuts a giant tour into `num_vehicles` tours of consecutive nodes, each starting and
+        ending at the depot (Prins' split). The cuts are a shortest path in the DAG whose arcs (i, j)
+        stand for a tour visiting giant_tour[i:j]: one layer per vehicle, and a running minimum
+        (a monotone queue when the tours are bounded) makes each layer O(n), O(n * k) overall.
+        Every vehicle gets at least one node when there are enough nodes.
+
+        Args:
+            graph (CompactGraph): A complete graph, such as `Graph.metric_closure()`.
+            giant_tour (list): The integer IDs of the nodes to visit, depot excluded.
+            depot (int): The integer ID of the depot.
+            num_vehicles (int): Number of vehicles.
+            max_route_size (int, optional): Maximum number of nodes of a tour. Defaults to None (no limit).
+
+        Returns:
+            dict: The solution, where keys are vehicle IDs and values are lists of integer IDs.
+
+        Raises:
+            ValueError: If the nodes do not fit in `num_vehicles` tours of `max_route_size` nodes.
+        """
+        n = len(giant_tour)
+        limit = n if max_route_size is None else max_route_size
+        if n > num_vehicles * limit:
+            raise ValueError(f"{n} nodes do not fit in {num_vehicles} tours of at most {limit} nodes.")
+
+        weight = graph.get_edge_weight
+        from_depot = [weight(depot, node) for node in giant_tour]
+        to_depot = [weight(node, depot) for node in giant_tour]
+        # along[j] is the length of the path giant_tour[0] -> ... -> giant_tour[j]
+        along = [0.0] * n
+        for j in range(1, n):
+            along[j] = along[j - 1] + weight(giant_tour[j - 1], giant_tour[j])
+
+        # A tour visiting giant_tour[i:j] costs from_depot[i] - along[i] + along[j - 1] + to_depot[j - 1]:
+        # the best start i for an end j is a minimum of a term depending on i only
+        routes = min(num_vehicles, n)
+        previous = [0.0] + [math.inf] * n  # previous[j]: best cost of covering giant_tour[:j] with r tours
+        starts = []
+        for r in range(routes):
+            current = [math.inf] * (n + 1)
+            start_of = [-1] * (n + 1)
+            window = deque()  # Starts i by increasing value of previous[i] + from_depot[i] - along[i]
+            for j in range(1, n + 1):
+                i = j - 1
+                if previous[i] < math.inf:
+                    value = previous[i] + from_depot[i] - along[i]
+                    while window and window[-1][0] >= value:
+                        window.pop()
+                    window.append((value, i))
+                while window and window[0][1] < j - limit:
+                    window.popleft()
+                if window:
+                    current[j] = window[0][0] + along[j - 1] + to_depot[j - 1]
+                    start_of[j] = window[0][1]
+            starts.append(start_of)
+            previous = current
+
+        if previous[n] == math.inf:
+            raise ValueError(f"{n} nodes do not fit in {num_vehicles} tours of at most {limit} nodes.")
+
+        solution = {v: [depot, depot] for v in range(num_vehicles)}
+        end = n
+        for r in range(routes - 1, -1, -1):
+            start = starts[r][end]
+            solution[r] = [depot] + list(giant_tour[start:end]) + [depot]
+            end = start
+        return solution
+
+    @staticmethod
+    def nearest_neighbor_tour(graph, start_node, nodes):
+        """
+        Orders nodes with the nearest neighbor heuristic, from a start node, in O(n^2) vectorized steps.
+
+        Args:
+            graph (CompactGraph): A complete dense graph, such as `Graph.metric_closure()`.
+            start_node (int): The integer ID of the start node, not included in the result.
+            nodes (list): The integer IDs of the nodes to order.
+
+        Returns:
+            list: The giant tour, the nodes in the order they are visited.
+        """
+        remaining = np.array(nodes, dtype=np.int64)
+        tour = []
+        current = start_node
+        while remaining.size:
+            distances = graph.matrix[current, remaining]
+            k = int(np.argmin(np.where(np.isnan(distances), np.inf, distances)))
+            current = int(remaining[k])
+            tour.append(current)
+            remaining[k] = remaining[-1]
+            remaining = remaining[:-1]
+        return tour
+
+    @staticmethod
+    def crossover(graph, parent1, parent2, rng=random):
+        """
+        Performs crossover between two parents to produce an offspring: each tour is taken from
+        one of the parents, then the nodes covered by no tour are added with shortest paths.
+
+        Args:
+            graph (Graph): The graph object.
+            parent1 (dict): The first parent solution.
+            parent2 (dict): The second parent solution.
+            rng (random.Random, optional): Source of randomness. Defaults to the global `random` module.
+
+        Returns:
+            dict: The offspring, a valid solution.
+        """
+        offspring = {}
+        for vehicle_id in parent1.keys():
+            # Copy the tours, the parents must not be modified when missing nodes are added
+            if rng.random() < 0.5:
+                offspring[vehicle_id] = list(parent1[vehicle_id])
+            else:
+                offspring[vehicle_id] = list(parent2[vehicle_id])
+
+        # Ensure all nodes are covered and vehicles return to their start
+        all_nodes = set(graph.get_nodes())
+        covered_nodes = set(node for tour in offspring.values() for node in tour)
+        missing_nodes = all_nodes - covered_nodes
+
+        # Distribute missing nodes among vehicles
+        for node in missing_nodes:
+            vehicle_id = rng.choice(list(offspring.keys()))
+            last_node = offspring[vehicle_id][-1]
+            if graph.has_edge(last_node, node):
+                offspring[vehicle_id].append(node)
+            else:
+                # Find a valid path to the node
+                path = graph.shortest_path(last_node, node)
+                offspring[vehicle_id].extend(path[1:])
+
+        # Ensure each vehicle returns to its start node
+        for vehicle_id, tour in offspring.items():
+            if tour[0] != tour[-1]:
+                last_node = tour[-1]
+                start_node = tour[0]
+                if graph.has_edge(last_node, start_node):
+                    tour.append(start_node)
+                else:
+                    # Find a valid path back to the start node
+                    path = graph.shortest_path(last_node, start_node)
+                    tour.extend(path[1:])
+
+        return offspring
+
+    @staticmethod
+    def mutate(graph, solution, mutation_rate, rng=random):
+        """
+        Mutates a solution by swapping nodes or moving nodes between vehicles.
+
+        Args:
+            graph (Graph): The graph object.
+            solution (dict): The solution to mutate, left unchanged.
+            mutation_rate (float): Probability of mutation.
+            rng (random.Random, optional): Source of randomness. Defaults to the global `random` module.
+
+        Returns:
+            dict: The mutated solution, or `solution` itself if no mutation happened.
+        """
+        if rng.random() < mutation_rate:
+            # Infeasible moves are rejected by `apply_random_move`, the neighbor is always valid
+            return Algorithms.generate_neighbor_multi_vehicle(graph, solution, rng)
+        return solution
@@ -0,0 +1,393 @@
+import random
+import time
+import numpy as np
+from algorithms import (
+    Algorithms, GIANT_TOUR_CROSSOVERS, MIN_LEVEL_MOVES, MOVES_PER_NODE, HIGH_ACCEPTANCE, FAST_COOLING_RATE,
+    FROZEN_ACCEPTANCE, REHEAT_LEVELS, MAX_REHEATS, REHEAT_RATIO,
+)
+from local_search import LocalSearch
+
+# Maximum number of moves of a simulated annealing step, so that a deadline is never missed by much
+STEP_MOVES = 1000
+
+
+class AnytimeSolver:
+    def __init__(self, callback=None):
+        """
+        Base class of the solvers that can be stopped at any moment with a valid solution: the work is
+        done in short steps, the best solution found so far can be read between two steps, and the search
+        can be resumed later where it stopped.
+
+        Subclasses implement `_step`, which does one step of work and returns False once the search is
+        over, and the `best_solution` and `best_cost` properties.
+
+        Args:
+            callback (callable, optional): Called with the solver after each step, to report progress.
+
+        Attributes:
+            done (bool): True once the search is over, further steps do nothing.
+            steps (int): Number of steps done.
+            elapsed_time (float): Time spent in the solver (setup and steps), in seconds.
+        """
+        self.callback = callback
+        self.done = False
+        self.steps = 0
+        self.elapsed_time = 0.0
+
+    def step(self):
+        """
+        Does one step of the search.
+
+        Returns:
+            bool: False if the search is over, True otherwise.
+        """
+        if self.done:
+            return False
+        start_time = time.perf_counter()
+        self.done = not self._step()
+        self.steps += 1
+        self.elapsed_time += time.perf_counter() - start_time
+        if self.callback is not None:
+            self.callback(self)
+        return not self.done
+
+    def run(self, until=None, time_limit=None, max_steps=None, stop=None):
+        """
+        Does steps until the search is over or one of the limits is reached. Can be called again to resume.
+
+        Args:
+            until (float, optional): Deadline, as a `time.monotonic()` value. Defaults to None.
+            time_limit (float, optional): Maximum duration of this call, in seconds. Defaults to None.
+            max_steps (int, optional): Maximum number of steps of this call. Defaults to None.
+            stop (optional): Event (anything with an `is_set` method) stopping the search when set.
+
+        Returns:
+            tuple: (best_solution, best_cost), the best solution found so far.
+        """
+        if time_limit is not None:
+            deadline = time.monotonic() + time_limit
+            until = deadline if until is None else min(until, deadline)
+        steps = 0
+        while not self.done:
+            if until is not None and time.monotonic() >= until:
+                break
+            if max_steps is not None and steps >= max_steps:
+                break
+            if stop is not None and stop.is_set():
+                break
+            self.step()
+            steps += 1
+        return self.best_solution, self.best_cost
+
+    def _step(self):
+        raise NotImplementedError
+
+    @property
+    def best_solution(self):
+        raise NotImplementedError
+
+    @property
+    def best_cost(self):
+        raise NotImplementedError
+
+
+class AnnealingSolver(AnytimeSolver):
+    def __init__(self, graph, initial_temp, min_temp, cooling_rate, max_iterations, num_vehicles,
+                 metric_closure=False, seed=None, debug=False, initialization="random", schedule="geometric",
+                 max_stagnation=None, callback=None):
+        """
+        Anytime version of `Algorithms.simulated_annealing`, see it for the parameters. A step tries
+        at most STEP_MOVES moves of the current temperature level.
+
+        Raises:
+            ValueError: If the schedule is unknown.
+        """
+        super().__init__(callback)
+        start_time = time.perf_counter()
+        if schedule not in ("geometric", "adaptive"):
+            raise ValueError(f"Unknown schedule: {schedule}. Use 'geometric' or 'adaptive'.")
+        self.graph = graph
+        self.min_temp = min_temp
+        self.cooling_rate = cooling_rate
+        self.schedule = schedule
+        self.max_stagnation = max_stagnation
+        self.debug = debug
+        self.metric_closure = metric_closure
+        self.rng = rng = random.Random(seed) if seed is not None else random
+
+        nodes = graph.get_nodes()
+        start_node = rng.choice(nodes)
+        nodes.remove(start_node)
+
+        # The search runs on the integer-indexed representation of the graph
+        if metric_closure:
+            self.compact = compact = graph.metric_closure()
+            self._current = Algorithms.initialize_solution(
+                [compact.index[node] for node in nodes], compact.index[start_node], num_vehicles, compact, rng,
+                initialization
+            )
+        else:
+            self.compact = compact = graph.compact()
+            self._current = compact.encode_solution(
+                Algorithms.initialize_solution(nodes, start_node, num_vehicles, graph, rng, initialization)
+            )
+
+        self._best = Algorithms.copy_solution(self._current)
+        self._current_cost = Algorithms.compute_total_cost(compact, self._current)
+        self._best_cost = self._current_cost
+        # The current solution is modified in place, the best one is only copied when we leave it
+        self._best_is_current = False
+        self._best_paths = None
+
+        for vehicle_id, path in self.best_solution.items():
+            graph.set_tsp_path(vehicle_id, path)
+
+        if schedule == "adaptive":
+            initial_temp = Algorithms.calibrate_temperature(compact, self._current, rng) or initial_temp
+            max_iterations = max(MIN_LEVEL_MOVES, MOVES_PER_NODE * len(graph.get_nodes()))
+        self.initial_temp = initial_temp
+        self.max_iterations = max_iterations
+        self.temp = initial_temp
+
+        self.number_iterations = 0
+        self.stagnation = 0  # Temperature levels since the best solution last improved
+        self.reheats = 0
+        self._start_level()
+        self.elapsed_time = time.perf_counter() - start_time
+
+    def _to_paths(self, solution):
+        """Converts a solution of the search into tours of the graph."""
+        paths = self.compact.decode_solution(solution)
+        return Algorithms.expand_solution(self.graph, paths) if self.metric_closure else paths
+
+    @property
+    def best_solution(self):
+        """dict: The best solution found so far, as tours of the graph."""
+        if self._best_paths is None:
+            self._best_paths = self._to_paths(self._current if self._best_is_current else self._best)
+        return self._best_paths
+
+    @property
+    def best_cost(self):
+        """float: Cost of the best solution found so far."""
+        return self._best_cost
+
+    def _start_level(self):
+        self._level_moves = 0
+        self._level_best_cost = self._best_cost
+        self._tried = self._accepted = 0
+
+    def _step(self):
+        if self.temp <= self.min_temp:
+            return False
+
+        moves = min(STEP_MOVES, self.max_iterations - self._level_moves)
+        best_cost = self._best_cost
+        self._best, self._current_cost, self._best_cost, self._best_is_current, tried, accepted = \
+            Algorithms.metropolis_steps(self.compact, self._current, self.temp, moves, self.rng, self._current_cost,
+                                        self._best, self._best_cost, self._best_is_current, self.debug)
+        if self._best_cost < best_cost:
+            self._best_paths = None
+        self._tried += tried
+        self._accepted += accepted
+        self.number_iterations += moves
+        self._level_moves += moves
+        if self._level_moves < self.max_iterations:
+            return True
+        return self._end_level()
+
+    def _end_level(self):
+        """
+        Updates the temperature at the end of a level.
+
+        Returns:
+            bool: False if the search is over.
+        """
+        #print(f"Temperature: {self.temp:.2f}, Current cost: {self._current_cost:.2f}, Best cost: {self._best_cost:.2f}")
+        self.stagnation = 0 if self._best_cost < self._level_best_cost else self.stagnation + 1
+        if self.max_stagnation is not None and self.stagnation >= self.max_stagnation:
+            return False
+        if self.schedule == "geometric":
+            self.temp *= self.cooling_rate
+        elif self.stagnation >= REHEAT_LEVELS and self._accepted < FROZEN_ACCEPTANCE * self._tried:
+            if self.reheats == MAX_REHEATS:
+                return False
+            self.reheats += 1
+            self.stagnation = 0
+            self.temp = self.initial_temp * REHEAT_RATIO
+            # The search goes on from the best solution
+            if not self._best_is_current:
+                self._current = Algorithms.copy_solution(self._best)
+                self._current_cost = self._best_cost
+                self._best_is_current = True
+        else:
+            self.temp *= FAST_COOLING_RATE if self._accepted > HIGH_ACCEPTANCE * self._tried else self.cooling_rate
+        self._start_level()
+        return self.temp > self.min_temp
+
+
+class GeneticSolver(AnytimeSolver):
+    def __init__(self, graph, population_size, generations, mutation_rate, num_vehicles, debug=False,
+                 workers=1, seed=None, crossover="tours", local_search_rate=0.0, callback=None):
+        """
+        Anytime version of `Algorithms.genetic_algorithm`, see it for the parameters. A step is a generation.
+        With `workers` > 1 the solver holds a process pool: call `close` (or use it as a context manager).
+
+        Raises:
+            ValueError: If the crossover is unknown.
+        """
+        super().__init__(callback)
+        start_time = time.perf_counter()
+        if crossover != "tours" and crossover not in GIANT_TOUR_CROSSOVERS:
+            raise ValueError(f"Unknown crossover: {crossover}. Use one of {sorted(GIANT_TOUR_CROSSOVERS)} or 'tours'.")
+        self.graph = graph
+        self.population_size = population_size
+        self.generations = generations
+        self.mutation_rate = mutation_rate
+        self.num_vehicles = num_vehicles
+        self.debug = debug
+        self.crossover = crossover
+        self.local_search_rate = local_search_rate
+        self.rng = rng = random.Random(seed) if seed is not None else random
+
+        self.giant_tours = crossover in GIANT_TOUR_CROSSOVERS
+        self.engine = None
+        if self.giant_tours:
+            # All the individuals share the depot, they only differ by the order of the other nodes
+            self.closure = graph.metric_closure()
+            self.depot = self.closure.index[rng.choice(graph.get_nodes())]
+            self.customers = [i for i in range(self.closure.number_of_nodes()) if i != self.depot]
+            if local_search_rate > 0:
+                # The improved tours stay one cut of their concatenation into as many tours, see `_step`
+                self.engine = LocalSearch(self.closure, keep_routes=True)
+
+        self.pool = None
+        if workers > 1:
+            # Imported here, the parallel module depends on the algorithms one
+            from parallel import OffspringPool
+            self.pool = OffspringPool(graph, workers)
+
+        self.generation = 0
+        self._best = None
+        self._best_cost = float('inf')
+        self._best_paths = None
+        self.population = self._initialize_population()
+        self._costs, self._fitness_values = self._fitness(self.population)
+        self.elapsed_time = time.perf_counter() - start_time
+
+    def close(self):
+        """
+        Shuts the process pool down, if any. The solver cannot do more steps with workers afterwards.
+        """
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _decode(self, individual):
+        """Converts an individual into a solution."""
+        if self.giant_tours:
+            return Algorithms.split_giant_tour(self.closure, individual, self.depot, self.num_vehicles)
+        return individual
+
+    def _initialize_population(self):
+        """Initializes the population with random valid solutions."""
+        rng = self.rng
+        if self.giant_tours:
+            return [rng.sample(self.customers, len(self.customers)) for _ in range(self.population_size)]
+
+        population = []
+        for _ in range(self.population_size):
+            nodes = self.graph.get_nodes()
+            start_node = rng.choice(nodes)
+            nodes.remove(start_node)
+            rng.shuffle(nodes)  # Shuffle nodes for diversity
+            solution = Algorithms.initialize_solution(nodes, start_node, self.num_vehicles, self.graph, rng)
+            population.append(solution)
+        return population
+
+    def _fitness(self, population):
+        """Calculates the cost and the fitness of every individual in one batch (lower cost is better)."""
+        if self.giant_tours:
+            costs = Algorithms.compute_total_costs(self.closure, [self._decode(ind) for ind in population])
+        else:
+            costs = Algorithms.compute_total_costs(self.graph, population)
+        return costs, 1 / (1 + costs)
+
+    def _select_parents(self, count):
+        """Selects `count` pairs of parents using a roulette wheel selection."""
+        # The cumulative weights are computed once per generation, each draw is then a binary search
+        cum_weights = np.cumsum(self._fitness_values).tolist()
+        parents = self.rng.choices(self.population, cum_weights=cum_weights, k=2 * count)
+        return list(zip(parents[::2], parents[1::2]))
+
+    @property
+    def best_solution(self):
+        """dict or None: The best solution found so far, as tours of the graph (None before the first generation)."""
+        if self._best_paths is None and self._best is not None:
+            self._best_paths = self._decode(self._best)
+            if self.giant_tours:
+                self._best_paths = Algorithms.expand_solution(
+                    self.graph, self.closure.decode_solution(self._best_paths)
+                )
+        return self._best_paths
+
+    @property
+    def best_cost(self):
+        """float: Cost of the best solution found so far."""
+        return self._best_cost
+
+    def _step(self):
+        if self.generation >= self.generations:
+            return False
+        rng = self.rng
+
+        # Select parents
+        pairs = self._select_parents(self.population_size)
+
+        # Perform crossover and mutation
+        if self.pool is not None:
+            population = self.pool.offspring(pairs, self.mutation_rate, rng, self.crossover)
+        else:
+            # One seed per offspring, drawn as `OffspringPool` does, so the result does not depend on the pool
+            seeds = [rng.getrandbits(64) for _ in pairs]
+            population = [
+                Algorithms.make_offspring(
+                    self.graph, parent1, parent2, self.mutation_rate, self.crossover, random.Random(seed)
+                )
+                for (parent1, parent2), seed in zip(pairs, seeds)
+            ]
+
+        if self.engine is not None:
+            for k, individual in enumerate(population):
+                if rng.random() < self.local_search_rate:
+                    improved, _ = self.engine.improve(self._decode(individual))
+                    # No route was emptied, so the improved tours are one of the cuts of their concatenation
+                    # into as many tours, and its optimal split is at least as good as them
+                    population[k] = [node for v in sorted(improved) for node in improved[v][1:-1]]
+
+        if self.debug:
+            if self.giant_tours:
+                assert all(sorted(ind) == self.customers for ind in population), "Invalid offspring"
+            else:
+                assert all(Algorithms.validate_solution(self.graph, ind) for ind in population), "Invalid offspring"
+
+        # The costs are computed once per generation, for the selection and the best solution
+        self.population = population
+        self._costs, self._fitness_values = self._fitness(population)
+
+        # Update the best solution
+        best_index = int(np.argmin(self._costs))
+        if self._costs[best_index] < self._best_cost:
+            self._best = population[best_index]
+            self._best_cost = float(self._costs[best_index])
+            self._best_paths = None
+
+        #print(f"Generation {self.generation + 1}: Best cost = {self._best_cost:.2f}")
+        self.generation += 1
+        return self.generation < self.generations
@@ -0,0 +1,145 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Columns of the geonames files
+GEONAMES_COLUMNS = ["geonameid", "name", "asciiname", "alternatenames", "latitude", "longitude",
+                    "feature_class", "feature_code", "country_code", "cc2", "admin1_code",
+                    "admin2_code", "admin3_code", "admin4_code", "population", "elevation",
+                    "dem", "timezone", "modification_date"]
+
+# Geonames file read when GEONAMES_PATH is not set or does not exist
+DEFAULT_GEONAMES_PATH = "../data/FR/cities_of_france.txt"
+
+# The preprocessed table is stored in this directory, next to the geonames file
+CACHE_SUFFIX = ".cache"
+CACHE_FILES = ("names.npy", "coordinates.npy", "population.npy")
+CACHE_KEY_FILE = "key.txt"
+
+# The geonames coordinates have 5 decimals: stored as float32, they are rounded back when sampled
+COORDINATE_DECIMALS = 5
+
+# Seed of the city samples, so that a given n always gives the same cities
+SAMPLE_SEED = 42
+
+
+def geonames_file(path=None):
+    """
+    Finds the geonames file to read: `path` if given, else the GEONAMES_PATH environment variable,
+    else DEFAULT_GEONAMES_PATH. Relative paths are tried from the current directory, then from
+    the project root (where the .env file is).
+
+    Args:
+        path (str, optional): The path of the file. Defaults to None.
+
+    Returns:
+        str: The path of the file.
+
+    Raises:
+        FileNotFoundError: If no file is found.
+    """
+    candidates = [path] if path else [os.getenv("GEONAMES_PATH"), DEFAULT_GEONAMES_PATH]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for candidate in filter(None, candidates):
+        for full_path in (candidate, os.path.join(root, candidate)):
+            if os.path.isfile(full_path):
+                return full_path
+    raise FileNotFoundError(f"No geonames file found (tried {', '.join(filter(None, candidates))}).")
+
+
+def _source_key(path):
+    """
+    Identifies a version of a file by its size and modification time.
+    """
+    stat = os.stat(path)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def _read_geonames(path):
+    """
+    Reads the populated places of a geonames file.
+
+    Returns:
+        tuple: (names, coordinates, population), the coordinates as a (n, 2) float32 array of (latitude, longitude).
+    """
+    df = pd.read_csv(
+        path,
+        sep='\t',
+        header=None,
+        names=GEONAMES_COLUMNS,
+        usecols=["name", "latitude", "longitude", "feature_class", "population"],
+    )
+    df = df[df['feature_class'] == 'P']  # P = populated place
+    df = df.dropna(subset=['latitude', 'longitude'])
+
+    names = np.array(df['name'].astype(str).tolist())
+    coordinates = df[['latitude', 'longitude']].to_numpy(dtype=np.float32)
+    population = df['population'].fillna(0).to_numpy(dtype=np.int64)
+    return names, coordinates, population
+
+
+def load_cities(path=None):
+    """
+    Returns the populated places of the geonames file. The file is parsed once, into a table of
+    names, float32 coordinates and populations saved next to it, which later calls memory-map.
+    The table is rebuilt when the size or the modification time of the file changes.
+
+    Args:
+        path (str, optional): The geonames file, see `geonames_file`. Defaults to None.
+
+    Returns:
+        tuple: (names, coordinates, population)
+            - names (numpy.ndarray): The city names.
+            - coordinates (numpy.ndarray): (n, 2) float32 array of (latitude, longitude).
+            - population (numpy.ndarray): The populations, 0 if unknown.
+    """
+    source = geonames_file(path)
+    cache = source + CACHE_SUFFIX
+    key = _source_key(source)
+    key_path = os.path.join(cache, CACHE_KEY_FILE)
+
+    if os.path.isfile(key_path):
+        with open(key_path) as f:
+            if f.read() == key:
+                return tuple(np.load(os.path.join(cache, name), mmap_mode="r") for name in CACHE_FILES)
+
+    table = _read_geonames(source)
+    try:
+        os.makedirs(cache, exist_ok=True)
+        for name, array in zip(CACHE_FILES, table):
+            np.save(os.path.join(cache, name), array)
+        # Written last, so that an interrupted preprocessing is started again
+        with open(key_path, "w") as f:
+            f.write(key)
+    except OSError as error:
+        print(f"The city table could not be cached in {cache}: {error}")
+    return table
+
+
+def sample_cities(n, path=None):
+    """
+    Selects `n` populated places of the geonames file, always the same ones for a given `n`
+    (the same as `DataFrame.sample(n, random_state=42)` on the populated places).
+
+    Args:
+        n (int): Number of cities.
+        path (str, optional): The geonames file, see `geonames_file`. Defaults to None.
+
+    Returns:
+        pandas.DataFrame: The selected cities, with their 'name', 'latitude', 'longitude' and 'population'.
+
+    Raises:
+        ValueError: If the file contains fewer valid cities than the requested number `n`.
+    """
+    names, coordinates, population = load_cities(path)
+    if len(names) < n:
+        raise ValueError(f"The file contains only {len(names)} valid cities, but {n} are requested.")
+
+    picks = np.random.RandomState(SAMPLE_SEED).choice(len(names), size=n, replace=False)
+    picked = np.round(coordinates[picks].astype(np.float64), COORDINATE_DECIMALS)
+    return pd.DataFrame({
+        "name": names[picks].tolist(),
+        "latitude": picked[:, 0],
+        "longitude": picked[:, 1],
+        "population": population[picks],
+    })
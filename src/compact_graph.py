@@ -0,0 +1,404 @@
+import os
+import numpy as np
+from bisect import bisect_left
+
+# Graphs with a density above this threshold are stored as a dense matrix, the others as CSR arrays
+DENSE_THRESHOLD = 0.05
+
+# Files of the array dataset format, one .npy file per array (see `CompactGraph.save`)
+NODES_FILE = "nodes.npy"
+COORDINATES_FILE = "coordinates.npy"
+MATRIX_FILE = "matrix.npy"
+CSR_FILES = ("indptr.npy", "indices.npy", "weights.npy")
+
+
+class CompactGraph:
+    def __init__(self, nodes, matrix=None, indptr=None, indices=None, weights=None, coordinates=None):
+        """
+        Initializes an integer-indexed, array-backed graph.
+        Nodes are numbered from 0 to n - 1 in the order of `nodes`, and the edge weights are stored
+        either in a dense matrix (`matrix`) or in CSR arrays (`indptr`, `indices`, `weights`).
+        Use `from_graph` or `from_edges` rather than calling this constructor directly.
+
+        Attributes:
+            nodes (list): The node names, the index of a name in this list is its integer ID.
+            index (dict): A dictionary mapping node names to their integer ID.
+            matrix (numpy.ndarray or None): Dense (n, n) weight matrix, NaN where there is no edge.
+            indptr (numpy.ndarray or None): CSR row pointers, the neighbors of i are indices[indptr[i]:indptr[i + 1]].
+            indices (numpy.ndarray or None): CSR column indices, sorted within each row.
+            weights (numpy.ndarray or None): CSR edge weights, aligned with `indices`.
+            coordinates (numpy.ndarray or None): (n, 2) array of (longitude, latitude), if known.
+        """
+        self.nodes = list(nodes)
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+        self.matrix = matrix
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.coordinates = coordinates
+        self._keys = None
+        self._build_views()
+
+    def _build_views(self):
+        """
+        Builds memoryviews over the arrays: indexing a memoryview returns plain Python numbers,
+        which is several times faster than indexing a NumPy array for scalar lookups.
+        """
+        if self.matrix is not None:
+            self._matrix_view = memoryview(self.matrix)
+        else:
+            self._indptr_view = memoryview(self.indptr)
+            self._indices_view = memoryview(self.indices)
+            self._weights_view = memoryview(self.weights)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in ("_matrix_view", "_indptr_view", "_indices_view", "_weights_view"):
+            state.pop(key, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._build_views()
+
+    @staticmethod
+    def from_graph(graph, dense=None):
+        """
+        Builds a compact graph from a `Graph`.
+
+        Args:
+            graph (Graph): The graph to convert.
+            dense (bool, optional): Force the dense (True) or the CSR (False) storage.
+                                    Defaults to None, which picks the storage from the graph density.
+
+        Returns:
+            CompactGraph: The compact representation of the graph.
+        """
+        nodes = list(graph.graph.nodes)
+        index = {node: i for i, node in enumerate(nodes)}
+        m = graph.graph.number_of_edges()
+
+        u = np.empty(m, dtype=np.int64)
+        v = np.empty(m, dtype=np.int64)
+        w = np.empty(m, dtype=np.float64)
+        for k, (a, b, weight) in enumerate(graph.graph.edges(data='weight', default=1)):
+            u[k] = index[a]
+            v[k] = index[b]
+            w[k] = weight
+
+        coordinates = None
+        positions = _node_positions(graph)
+        if positions is not None and len(positions) == len(nodes):
+            coordinates = np.array([positions[node] for node in nodes], dtype=np.float64).reshape(len(nodes), 2)
+
+        return CompactGraph.from_edges(nodes, u, v, w, dense=dense, coordinates=coordinates)
+
+    @staticmethod
+    def from_edges(nodes, u, v, w, dense=None, coordinates=None):
+        """
+        Builds a compact graph from edge arrays, without creating a Python object per edge.
+
+        Args:
+            nodes (list): The node names.
+            u (array-like): Integer ID of the first end of each undirected edge.
+            v (array-like): Integer ID of the second end of each undirected edge.
+            w (array-like): Weight of each edge.
+            dense (bool, optional): Force the dense (True) or the CSR (False) storage.
+                                    Defaults to None, which picks the storage from the graph density.
+            coordinates (array-like, optional): (n, 2) array of (longitude, latitude).
+
+        Returns:
+            CompactGraph: The compact graph.
+        """
+        n = len(nodes)
+        u = np.asarray(u, dtype=np.int64)
+        v = np.asarray(v, dtype=np.int64)
+        w = np.asarray(w, dtype=np.float64)
+
+        if dense is None:
+            possible_edges = n * (n - 1) / 2
+            dense = possible_edges > 0 and len(u) / possible_edges >= DENSE_THRESHOLD
+
+        if dense:
+            matrix = np.full((n, n), np.nan, dtype=np.float64)
+            matrix[u, v] = w
+            matrix[v, u] = w
+            return CompactGraph(nodes, matrix=matrix, coordinates=coordinates)
+
+        # Each undirected edge is stored in both rows
+        rows = np.concatenate((u, v))
+        cols = np.concatenate((v, u))
+        data = np.concatenate((w, w))
+        order = np.lexsort((cols, rows))
+
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+        indices = np.ascontiguousarray(cols[order], dtype=np.int32)
+        weights = np.ascontiguousarray(data[order])
+        return CompactGraph(nodes, indptr=indptr, indices=indices, weights=weights, coordinates=coordinates)
+
+    def save(self, directory):
+        """
+        Saves the graph as a directory of .npy arrays: the node names, their coordinates (if known) and
+        the storage arrays themselves, the CSR arrays (`indptr`, `indices`, `weights`) or the dense matrix.
+        Unlike a pickled `Graph`, `load` can memory-map the arrays and use them without any copy.
+
+        Args:
+            directory (str): The directory, created if needed.
+
+        Returns:
+            None
+        """
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, NODES_FILE), np.array(self.nodes))
+        arrays = {MATRIX_FILE: self.matrix} if self.is_dense else dict(zip(CSR_FILES, (self.indptr, self.indices, self.weights)))
+        if self.coordinates is not None:
+            arrays[COORDINATES_FILE] = np.asarray(self.coordinates, dtype=np.float64)
+        for name in (COORDINATES_FILE, MATRIX_FILE) + CSR_FILES:
+            path = os.path.join(directory, name)
+            if name in arrays:
+                np.save(path, arrays[name])
+            elif os.path.exists(path):
+                os.remove(path)
+
+    @staticmethod
+    def load(directory, dense=None, mmap=True):
+        """
+        Loads a graph saved by `save`. The arrays are memory-mapped copy-on-write: the compact graph is
+        built directly on them, only the pages that are read are loaded, and changing weights in place
+        (`set_edge_weights`) does not modify the files.
+
+        Args:
+            directory (str): The directory of the arrays.
+            dense (bool, optional): Force the dense (True) or the CSR (False) storage, which builds new
+                                    arrays if the saved storage is the other one. Defaults to None (the saved one).
+            mmap (bool, optional): Memory-map the arrays instead of reading them. Defaults to True.
+
+        Returns:
+            CompactGraph: The compact graph.
+
+        Raises:
+            FileNotFoundError: If the directory does not contain the arrays.
+        """
+        mode = "c" if mmap else None
+        nodes = np.load(os.path.join(directory, NODES_FILE)).tolist()
+        coordinates_path = os.path.join(directory, COORDINATES_FILE)
+        coordinates = np.load(coordinates_path) if os.path.exists(coordinates_path) else None
+
+        matrix_path = os.path.join(directory, MATRIX_FILE)
+        if os.path.exists(matrix_path):
+            graph = CompactGraph(nodes, matrix=np.load(matrix_path, mmap_mode=mode), coordinates=coordinates)
+        else:
+            indptr, indices, weights = (np.load(os.path.join(directory, name), mmap_mode=mode) for name in CSR_FILES)
+            graph = CompactGraph(nodes, indptr=indptr, indices=indices, weights=weights, coordinates=coordinates)
+
+        if dense is not None and graph.is_dense != dense:
+            us, vs, w = graph.edge_arrays()
+            graph = CompactGraph.from_edges(nodes, us, vs, w, dense=dense, coordinates=coordinates)
+        return graph
+
+    @property
+    def is_dense(self):
+        """
+        bool: True if the weights are stored in a dense matrix, False if they are stored as CSR arrays.
+        """
+        return self.matrix is not None
+
+    def number_of_nodes(self):
+        """
+        Returns:
+            int: The number of nodes.
+        """
+        return len(self.nodes)
+
+    def number_of_edges(self):
+        """
+        Returns:
+            int: The number of (undirected) edges.
+        """
+        if self.is_dense:
+            return int(np.count_nonzero(~np.isnan(self.matrix))) // 2
+        return len(self.indices) // 2
+
+    def _find(self, i, j):
+        """
+        Returns the position of the edge (i, j) in the CSR arrays, or -1 if there is no such edge.
+        """
+        start = self._indptr_view[i]
+        end = self._indptr_view[i + 1]
+        k = bisect_left(self._indices_view, j, start, end)
+        if k < end and self._indices_view[k] == j:
+            return k
+        return -1
+
+    def has_edge(self, i, j):
+        """
+        Checks whether there is an edge between two nodes.
+
+        Args:
+            i (int): The integer ID of the first node.
+            j (int): The integer ID of the second node.
+
+        Returns:
+            bool: True if the edge exists, False otherwise.
+        """
+        if self.matrix is not None:
+            weight = self._matrix_view[i, j]
+            return weight == weight  # NaN marks a missing edge
+        return self._find(i, j) >= 0
+
+    def get_edge_weight(self, i, j):
+        """
+        Retrieve the weight of an edge between two nodes.
+
+        Args:
+            i (int): The integer ID of the first node.
+            j (int): The integer ID of the second node.
+
+        Returns:
+            float: The weight of the edge if it exists, otherwise 0 (as `Graph.get_edge_weight`).
+        """
+        if self.matrix is not None:
+            weight = self._matrix_view[i, j]
+            return weight if weight == weight else 0
+        k = self._find(i, j)
+        return self._weights_view[k] if k >= 0 else 0
+
+    def get_edge_weights(self, us, vs):
+        """
+        Vectorized version of `get_edge_weight`.
+
+        Args:
+            us (array-like): Integer IDs of the first ends of the edges.
+            vs (array-like): Integer IDs of the second ends of the edges.
+
+        Returns:
+            numpy.ndarray: The weights of the edges, 0 where there is no edge.
+        """
+        us = np.asarray(us, dtype=np.int64)
+        vs = np.asarray(vs, dtype=np.int64)
+
+        if self.is_dense:
+            weights = self.matrix[us, vs]
+            return np.where(np.isnan(weights), 0.0, weights)
+
+        # Rows are sorted and so are the columns inside each row: the global keys i * n + j are sorted
+        n = len(self.nodes)
+        keys = self._sorted_keys()
+        if len(keys) == 0:
+            return np.zeros(len(us), dtype=np.float64)
+        queries = us * n + vs
+        positions = np.minimum(np.searchsorted(keys, queries), len(keys) - 1)
+        found = keys[positions] == queries
+        return np.where(found, self.weights[positions], 0.0)
+
+    def edge_arrays(self):
+        """
+        Returns every edge once, with i < j, in a deterministic order.
+
+        Returns:
+            tuple: (us, vs, weights), three arrays of the same length.
+        """
+        if self.is_dense:
+            us, vs = np.nonzero(~np.isnan(self.matrix))
+        else:
+            n = len(self.nodes)
+            us = np.repeat(np.arange(n, dtype=np.int64), np.diff(self.indptr))
+            vs = self.indices
+        upper = us < vs
+        us, vs = us[upper], vs[upper]
+        return us, vs, self.get_edge_weights(us, vs)
+
+    def set_edge_weights(self, us, vs, weights):
+        """
+        Changes the weights of existing edges in place, in both directions.
+
+        Args:
+            us (array-like): Integer IDs of the first ends of the edges.
+            vs (array-like): Integer IDs of the second ends of the edges.
+            weights (array-like): The new weights.
+
+        Raises:
+            KeyError: If one of the edges does not exist.
+        """
+        us = np.asarray(us, dtype=np.int64)
+        vs = np.asarray(vs, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float64)
+
+        if self.is_dense:
+            if np.isnan(self.matrix[us, vs]).any():
+                raise KeyError("Some edges do not exist.")
+            self.matrix[us, vs] = weights
+            self.matrix[vs, us] = weights
+            return
+
+        n = len(self.nodes)
+        keys = self._sorted_keys()
+        for a, b in ((us, vs), (vs, us)):
+            queries = a * n + b
+            positions = np.minimum(np.searchsorted(keys, queries), max(len(keys) - 1, 0))
+            if len(queries) and not (keys[positions] == queries).all():
+                raise KeyError("Some edges do not exist.")
+            self.weights[positions] = weights
+
+    def _sorted_keys(self):
+        """
+        Returns the sorted array of i * n + j keys of the CSR entries, computed once.
+        """
+        if self._keys is None:
+            n = len(self.nodes)
+            rows = np.repeat(np.arange(n, dtype=np.int64), np.diff(self.indptr))
+            self._keys = rows * n + self.indices
+        return self._keys
+
+    def get_neighbors(self, i):
+        """
+        Retrieve the neighbors of a given node.
+
+        Args:
+            i (int): The integer ID of the node.
+
+        Returns:
+            numpy.ndarray: The integer IDs of the neighboring nodes.
+        """
+        if self.is_dense:
+            return np.flatnonzero(~np.isnan(self.matrix[i]))
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def encode_solution(self, solution):
+        """
+        Converts a solution expressed with node names into integer IDs.
+
+        Args:
+            solution (dict): Keys are vehicle IDs and values are lists of node names.
+
+        Returns:
+            dict: The same solution with integer IDs.
+        """
+        index = self.index
+        return {vehicle_id: [index[node] for node in tour] for vehicle_id, tour in solution.items()}
+
+    def decode_solution(self, solution):
+        """
+        Converts a solution expressed with integer IDs back into node names.
+
+        Args:
+            solution (dict): Keys are vehicle IDs and values are lists of integer IDs.
+
+        Returns:
+            dict: The same solution with node names.
+        """
+        nodes = self.nodes
+        return {vehicle_id: [nodes[i] for i in tour] for vehicle_id, tour in solution.items()}
+
+
+def _node_positions(graph):
+    """
+    Returns the positions of the nodes of a `Graph`, from its `positions` attribute
+    or from the `pos` node attribute, or None if the graph has no positions.
+    """
+    positions = getattr(graph, "positions", None)
+    if positions:
+        return positions
+    positions = {node: data["pos"] for node, data in graph.graph.nodes(data=True) if "pos" in data}
+    return positions or None
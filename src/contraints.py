@@ -1,4 +1,5 @@
 import random
+import numpy as np
 from graph import Graph
 from datetime import datetime
 
@@ -31,14 +32,176 @@ def poucentage_regard_to_hour(time_str):
         return None
 
 
-def shuffle_graph(graph, time = datetime.now().strftime("%H:%M")):
+def shuffle_graph(graph, time=None, changed_edges=None):
     """
-    Changes the graph by modifying the value of edges.
+    Changes the graph by modifying the value of edges, at a time of day ("HH:MM", defaults to now).
+    If a `changed_edges` list is given, the modified edges are appended to it, so that the current
+    solution can be updated with `Algorithms.reoptimize` instead of solving the problem again.
+    To keep the weights and evaluate several hours on the same graph, use a `TrafficProfile` instead.
     """
+    if time is None:
+        time = datetime.now().strftime("%H:%M")
     current_pourcentage = poucentage_regard_to_hour(time)
     for u, v in graph.graph.edges():
         if random.random() <= current_pourcentage:
-            graph.graph[v][u]['weight'] = round(graph.graph[u][v]['weight']*random_biased_low(), 2)
+            graph.set_edge_weight(u, v, round(graph.get_edge_weight(u, v)*random_biased_low(), 2))
         elif random.random() < 0.01:
-            graph.graph[u][v]['weight'] = -1
-    return graph
\ No newline at end of file
+            graph.set_edge_weight(u, v, -1)
+        else:
+            continue
+        if changed_edges is not None:
+            changed_edges.append((u, v))
+    return graph
+
+
+def shuffle_graph_vectorized(graph, time=None, seed=None, changed_edges=None):
+    """
+    Vectorized version of `shuffle_graph`: the same perturbation, with all the random draws done in
+    one NumPy batch on the weight array of `graph.compact()`, and only the modified edges written back.
+    Each edge is slowed down with the probability of the hour (its weight multiplied by the minimum of
+    four uniform draws in [1, 4], as `random_biased_low`), otherwise blocked (-1) with probability 0.01.
+
+    Args:
+        graph (Graph): The graph to modify.
+        time (str, optional): Time of day, as "HH:MM". Defaults to the current time.
+        seed (int, optional): Seed of the draws, the same graph, time and seed always give the same
+                              weights. Defaults to None (unpredictable).
+        changed_edges (list, optional): If given, the modified edges are appended to it.
+
+    Returns:
+        Graph: The modified graph.
+    """
+    if time is None:
+        time = datetime.now().strftime("%H:%M")
+    current_pourcentage = poucentage_regard_to_hour(time)
+    # The weights are read from the arrays of the compact representation, which is updated in place
+    compact = graph.compact()
+    us, vs, weights = compact.edge_arrays()
+
+    rng = np.random.default_rng(seed)
+    busy = rng.random(len(weights)) <= current_pourcentage
+    multipliers = 1 + 3 * rng.random((len(weights), 4)).min(axis=1)
+    blocked = ~busy & (rng.random(len(weights)) < 0.01)
+
+    new_weights = weights.copy()
+    new_weights[busy] = np.round(weights[busy] * multipliers[busy], 2)
+    new_weights[blocked] = -1
+    changed = np.flatnonzero(busy | blocked)
+
+    nodes = compact.nodes
+    modified = [(nodes[u], nodes[v]) for u, v in zip(us[changed].tolist(), vs[changed].tolist())]
+    graph.set_edge_weights(modified, new_weights[changed].tolist())
+    if changed_edges is not None:
+        changed_edges.extend(modified)
+    return graph
+
+
+# Number of hourly columns of a traffic profile
+HOURS = 24
+
+
+def hour_of(time):
+    """
+    Returns the hour of a time of day.
+
+    Args:
+        time (str or int or float): "HH:MM", or a number of hours (wrapped around 24).
+
+    Returns:
+        int: The hour, between 0 and 23.
+    """
+    if isinstance(time, str):
+        return int(time.split(":")[0]) % HOURS
+    return int(time) % HOURS
+
+
+class TrafficProfile:
+    def __init__(self, nodes, us, vs, multipliers):
+        """
+        Hourly traffic multipliers of the edges of a graph. Unlike `shuffle_graph`, the weights of the
+        graph are left untouched: the weight of an edge at hour h is its weight times multipliers[k, h],
+        or -1 (blocked) where the multiplier is negative. Use `from_graph` to draw a profile.
+
+        Attributes:
+            nodes (list): The node names, the index of a name in this list is its integer ID.
+            index (dict): A dictionary mapping node names to their integer ID.
+            us (numpy.ndarray): First ends of the edges, with us < vs, sorted by (us, vs).
+            vs (numpy.ndarray): Second ends of the edges.
+            multipliers (numpy.ndarray): The (m, 24) float32 multipliers, -1 for a blocked edge.
+        """
+        self.nodes = list(nodes)
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+        self.us = np.asarray(us, dtype=np.int64)
+        self.vs = np.asarray(vs, dtype=np.int64)
+        self.multipliers = np.asarray(multipliers, dtype=np.float32)
+        self._keys = self.us * len(self.nodes) + self.vs
+
+    @staticmethod
+    def from_graph(graph, seed=None):
+        """
+        Draws a profile for every edge of a graph: at each hour, an edge is slowed down with the
+        probability given by `poucentage_regard_to_hour` (a multiplier drawn as `random_biased_low`),
+        otherwise blocked with probability 0.01, as `shuffle_graph` does.
+
+        Args:
+            graph (Graph): The graph.
+            seed (int, optional): Seed of the draws. Defaults to None (unpredictable).
+
+        Returns:
+            TrafficProfile: The profile.
+        """
+        compact = graph.compact()
+        us, vs, _ = compact.edge_arrays()
+        rng = np.random.default_rng(seed)
+
+        m = len(us)
+        rates = np.array([poucentage_regard_to_hour(f"{hour:02d}:00") for hour in range(HOURS)])
+        busy = rng.random((m, HOURS)) <= rates
+        slowdowns = 1 + 3 * rng.random((m, HOURS, 4), dtype=np.float32).min(axis=2)
+        blocked = ~busy & (rng.random((m, HOURS)) < 0.01)
+
+        multipliers = np.where(busy, slowdowns, np.float32(1.0))
+        multipliers[blocked] = -1
+        return TrafficProfile(compact.nodes, us, vs, multipliers)
+
+    def edge_ids(self, us, vs):
+        """
+        Returns the rows of the multiplier table of edges given by their integer IDs, in any direction.
+
+        Raises:
+            KeyError: If one of the edges is not in the profile.
+        """
+        us = np.asarray(us, dtype=np.int64)
+        vs = np.asarray(vs, dtype=np.int64)
+        keys = np.minimum(us, vs) * len(self.nodes) + np.maximum(us, vs)
+        positions = np.minimum(np.searchsorted(self._keys, keys), max(len(self._keys) - 1, 0))
+        if len(keys) and not (self._keys[positions] == keys).all():
+            raise KeyError("Some edges are not in the traffic profile.")
+        return positions
+
+    def multiplier(self, u, v, time):
+        """
+        Returns the multiplier of the edge (u, v), given by node names, at a time of day.
+        """
+        k = self.edge_ids([self.index[u]], [self.index[v]])[0]
+        return float(self.multipliers[k, hour_of(time)])
+
+    def weights_at(self, weights, rows, time=None):
+        """
+        Returns the weights of edges at a time of day, or at every hour.
+
+        Args:
+            weights (array-like): The base weights of the edges.
+            rows (numpy.ndarray): Their rows in the multiplier table, from `edge_ids`.
+            time (str or int or float, optional): The time of day. Defaults to None (every hour).
+
+        Returns:
+            numpy.ndarray: A (len(rows),) array, or (len(rows), 24) for every hour, -1 for blocked edges.
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        if time is None:
+            multipliers = self.multipliers[rows]
+            weights = weights[:, None]
+        else:
+            multipliers = self.multipliers[rows, hour_of(time)]
+        return np.where((multipliers < 0) | (weights < 0), -1.0, weights * multipliers)
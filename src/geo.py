@@ -0,0 +1,129 @@
+import numpy as np
+from geopy.distance import geodesic
+
+# Mean earth radius used by geopy's great_circle, in kilometers
+EARTH_RADIUS_KM = 6371.009
+
+# WGS-84 ellipsoid, the one used by geopy's geodesic
+WGS84_A = 6378.137
+WGS84_F = 1 / 298.257223563
+WGS84_B = (1 - WGS84_F) * WGS84_A
+
+
+def haversine_distances(lat1, lon1, lat2, lon2):
+    """
+    Computes the great-circle distances between arrays of coordinates with the Haversine formula.
+    The earth is treated as a sphere, the error against geopy's geodesic is below 0.5%.
+
+    Args:
+        lat1 (array-like): Latitudes of the first points, in degrees.
+        lon1 (array-like): Longitudes of the first points, in degrees.
+        lat2 (array-like): Latitudes of the second points, in degrees.
+        lon2 (array-like): Longitudes of the second points, in degrees.
+
+    Returns:
+        numpy.ndarray: The distances in kilometers.
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(x, dtype=np.float64)) for x in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def vincenty_distances(lat1, lon1, lat2, lon2, tolerance=1e-12, max_iterations=200):
+    """
+    Computes the distances between arrays of coordinates on the WGS-84 ellipsoid with Vincenty's
+    inverse formula. It agrees with geopy's geodesic to well under a millimeter; the rare pairs for
+    which the iteration does not converge (nearly antipodal points) are computed with geopy.
+
+    Args:
+        lat1 (array-like): Latitudes of the first points, in degrees.
+        lon1 (array-like): Longitudes of the first points, in degrees.
+        lat2 (array-like): Latitudes of the second points, in degrees.
+        lon2 (array-like): Longitudes of the second points, in degrees.
+        tolerance (float, optional): Convergence threshold on lambda, in radians. Defaults to 1e-12.
+        max_iterations (int, optional): Maximum number of iterations. Defaults to 200.
+
+    Returns:
+        numpy.ndarray: The distances in kilometers.
+    """
+    lat1, lon1, lat2, lon2 = (np.atleast_1d(np.asarray(x, dtype=np.float64)) for x in (lat1, lon1, lat2, lon2))
+    a, b, f = WGS84_A, WGS84_B, WGS84_F
+
+    L = np.radians(lon2 - lon1)
+    U1 = np.arctan((1 - f) * np.tan(np.radians(lat1)))
+    U2 = np.arctan((1 - f) * np.tan(np.radians(lat2)))
+    sin_U1, cos_U1 = np.sin(U1), np.cos(U1)
+    sin_U2, cos_U2 = np.sin(U2), np.cos(U2)
+
+    def evaluate(lam, k):
+        # Terms of the iteration for the pairs k, given their current lambda
+        sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+        sin_sigma = np.hypot(cos_U2[k] * sin_lam, cos_U1[k] * sin_U2[k] - sin_U1[k] * cos_U2[k] * cos_lam)
+        cos_sigma = sin_U1[k] * sin_U2[k] + cos_U1[k] * cos_U2[k] * cos_lam
+        sigma = np.arctan2(sin_sigma, cos_sigma)
+        # Coincident points have sin_sigma == 0, their distance is 0 whatever alpha is
+        coincident = sin_sigma == 0
+        sin_alpha = cos_U1[k] * cos_U2[k] * sin_lam / np.where(coincident, 1.0, sin_sigma)
+        sin_alpha[coincident] = 0.0
+        cos2_alpha = 1 - sin_alpha ** 2
+        # Points on the equator have cos2_alpha == 0
+        equatorial = cos2_alpha == 0
+        cos_2sigma_m = cos_sigma - 2 * sin_U1[k] * sin_U2[k] / np.where(equatorial, 1.0, cos2_alpha)
+        cos_2sigma_m[equatorial] = 0.0
+        return sin_sigma, cos_sigma, sigma, sin_alpha, cos2_alpha, cos_2sigma_m
+
+    lam = L.copy()
+    converged = np.zeros(L.shape, dtype=bool)
+    # Only the pairs that have not converged yet are iterated
+    active = np.arange(L.size)
+    for _ in range(max_iterations):
+        sin_sigma, cos_sigma, sigma, sin_alpha, cos2_alpha, cos_2sigma_m = evaluate(lam[active], active)
+        C = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+        new_lam = L[active] + (1 - C) * f * sin_alpha * (
+            sigma + C * sin_sigma * (cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2))
+        )
+        done = np.abs(new_lam - lam[active]) <= tolerance
+        lam[active] = new_lam
+        converged[active[done]] = True
+        active = active[~done]
+        if active.size == 0:
+            break
+
+    sin_sigma, cos_sigma, sigma, sin_alpha, cos2_alpha, cos_2sigma_m = evaluate(lam, np.arange(L.size))
+    u2 = cos2_alpha * (a ** 2 - b ** 2) / b ** 2
+    A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    delta_sigma = B * sin_sigma * (cos_2sigma_m + B / 4 * (
+        cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+        - B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)
+    ))
+    distances = b * A * (sigma - delta_sigma)
+
+    for k in np.flatnonzero(~converged | np.isnan(distances)):
+        distances[k] = geodesic((lat1[k], lon1[k]), (lat2[k], lon2[k])).kilometers
+    return distances
+
+
+def geo_distances(lat1, lon1, lat2, lon2, method="geodesic"):
+    """
+    Computes the distances between arrays of coordinates in one batch.
+
+    Args:
+        lat1 (array-like): Latitudes of the first points, in degrees.
+        lon1 (array-like): Longitudes of the first points, in degrees.
+        lat2 (array-like): Latitudes of the second points, in degrees.
+        lon2 (array-like): Longitudes of the second points, in degrees.
+        method (str, optional): "geodesic" for ellipsoidal distances matching geopy's geodesic,
+                                "haversine" for faster spherical distances. Defaults to "geodesic".
+
+    Returns:
+        numpy.ndarray: The distances in kilometers.
+
+    Raises:
+        ValueError: If the method is unknown.
+    """
+    if method == "geodesic":
+        return vincenty_distances(lat1, lon1, lat2, lon2)
+    if method == "haversine":
+        return haversine_distances(lat1, lon1, lat2, lon2)
+    raise ValueError(f"Unknown distance method: {method}. Use 'geodesic' or 'haversine'.")
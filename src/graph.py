@@ -1,4 +1,5 @@
 import networkx as nx
+import numpy as np
 import matplotlib.pyplot as plt
 import pandas as pd
 import random
@@ -9,6 +10,11 @@ from pyproj import Transformer
 import pickle
 import os
 from dotenv import load_dotenv
+from cities import sample_cities
+from compact_graph import CompactGraph
+from geo import geo_distances
+from shortest_paths import ShortestPathOracle
+from spatial_index import SpatialIndex
 
 # Charger les variables d'environnement
 load_dotenv()
@@ -17,6 +23,43 @@ load_dotenv()
 geonames_path = os.getenv("GEONAMES_PATH")
 shapefile_path = os.getenv("SHAPEFILE_PATH")
 
+# Number of nearest nodes searched for a link when connecting the components of a geometric graph
+LINK_NEIGHBORS = 16
+
+
+class _EdgeData(dict):
+    """
+    Attribute dict of an edge of `Graph.graph`, which drops the derived structures of its graph when it
+    is written, so that `graph.graph[u][v]['weight'] = w` does not leave stale caches behind.
+    It is pickled as a plain dict.
+    """
+    __slots__ = ("_owner",)
+
+    def __init__(self, owner, data):
+        super().__init__(data)
+        self._owner = owner
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._owner._reset_caches()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._owner._reset_caches()
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._owner._reset_caches()
+
+    def pop(self, *args):
+        value = super().pop(*args)
+        self._owner._reset_caches()
+        return value
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
 class Graph:
     def __init__(self):
         """
@@ -25,10 +68,96 @@ class Graph:
         Attributes:
             graph (networkx.Graph): An instance of a NetworkX graph used to represent the graph structure.
             tsp_paths (dict): A dictionary to store paths related to the Traveling Salesman Problem (TSP).
+            traffic (TrafficProfile or None): Hourly multipliers of the weights, see `get_edge_weight` and `compact_at`.
         """
+        self._source = None
         self.graph = nx.Graph()
         self.tsp_paths = {}
-        
+        self.traffic = None
+        self._reset_caches()
+
+    def _reset_caches(self):
+        """
+        Drops every structure derived from the nodes and edges of the graph (compact representation,
+        shortest paths, spatial index, ...). Must be called each time a node, an edge or a weight changes.
+        """
+        self._compact = None
+        self._shortest_paths = None
+        self._metric_closure = None
+        self._spatial_index = None
+        self._traffic_csr = None
+
+    @property
+    def graph(self):
+        """
+        The networkx graph. For a graph loaded lazily (see `load`), the nodes and edges are stored in a
+        `CompactGraph` and the networkx graph is only built on first access, for drawing for instance.
+        """
+        if self._graph is None:
+            self._materialize()
+        return self._graph
+
+    @graph.setter
+    def graph(self, graph):
+        self._graph = graph
+        self._source = None
+
+    @property
+    def is_lazy(self):
+        """
+        bool: True while the networkx graph has not been built from the arrays.
+        """
+        return self._source is not None
+
+    def _materialize(self):
+        """
+        Builds the networkx graph of a lazily loaded graph, from its arrays.
+        """
+        compact = self._source
+        graph = nx.Graph()
+        nodes = compact.nodes
+        if compact.coordinates is not None:
+            graph.add_nodes_from((node, {'pos': pos}) for node, pos in self.positions.items())
+        else:
+            graph.add_nodes_from(nodes)
+        us, vs, weights = compact.edge_arrays()
+        graph.add_weighted_edges_from(
+            (nodes[u], nodes[v], w) for u, v, w in zip(us.tolist(), vs.tolist(), weights.tolist())
+        )
+        self.graph = graph
+        if self._compact is None:
+            self._compact = compact
+            self._watch_edges()
+
+    def _watch_edges(self):
+        """
+        Wraps the attribute dicts of the edges of the networkx graph in `_EdgeData`, called when the
+        compact representation is built from it, so that a direct write drops the caches built since.
+        """
+        adjacency = self._graph._adj
+        for u, neighbors in adjacency.items():
+            for v, data in neighbors.items():
+                if type(data) is not _EdgeData or data._owner is not self:
+                    # Both directions share the same dict
+                    neighbors[v] = adjacency[v][u] = _EdgeData(self, data)
+
+    def __getstate__(self):
+        # Derived structures are not serialized, they are rebuilt on demand
+        state = self.__dict__.copy()
+        for key in ("_compact", "_shortest_paths", "_metric_closure", "_spatial_index", "_traffic_csr"):
+            state.pop(key, None)
+        return state
+
+    def __setstate__(self, state):
+        # Graphs serialized before the caches existed do not have them in their state
+        self.traffic = None
+        self._source = None
+        state = dict(state)
+        if 'graph' in state:
+            state['_graph'] = state.pop('graph')
+        self.__dict__.update(state)
+        self._reset_caches()
+
     def get_infos(self):
         """
         Returns detailed information about the graph.
@@ -61,20 +190,237 @@ class Graph:
             None
         """
         self.graph.add_edge(u, v, weight=weight)
+        self._reset_caches()
+
+    def set_edge_weight(self, u, v, weight):
+        """
+        Changes the weight of an existing edge, keeping the derived structures up to date.
+        Writing in `self.graph[u][v]` directly also drops them, but nodes and edges must be added
+        with `add_edge` (or followed by `_reset_caches`).
+
+        Args:
+            u (hashable): The starting node of the edge.
+            v (hashable): The ending node of the edge.
+            weight (int or float): The new weight of the edge.
 
-    def get_edge_weight(self, u, v):
+        Returns:
+            None
+        """
+        if self.is_lazy:
+            self.set_edge_weights([(u, v)], [weight])
+            return
+        self.graph[u][v]['weight'] = weight
+        self._reset_caches()
+
+    def set_edge_weights(self, edges, weights):
+        """
+        Changes the weights of several existing edges at once. The compact representation is updated
+        in place instead of being rebuilt (so the object returned by an earlier `compact()` call sees
+        the new weights), the other derived structures are dropped once.
+
+        Args:
+            edges (list): The (u, v) edges.
+            weights (list): The new weights, in the order of `edges`.
+
+        Returns:
+            None
+        """
+        # Taken before writing in the networkx graph, whose edges drop the caches when written
+        spatial_index = self._spatial_index
+        if self.is_lazy:
+            # The arrays are the graph: only they are updated
+            compact = self._source
+        else:
+            compact = self._compact
+            adjacency = self.graph.adj
+            for (u, v), weight in zip(edges, weights):
+                adjacency[u][v]['weight'] = weight
+
+        self._reset_caches()
+        # Neither depends on the weights
+        self._spatial_index = spatial_index
+        if compact is not None:
+            index = compact.index
+            compact.set_edge_weights([index[u] for u, _ in edges], [index[v] for _, v in edges], weights)
+            self._compact = compact
+
+    def has_edge(self, u, v):
+        """
+        Checks whether there is an edge between two nodes.
+
+        Args:
+            u (hashable): The first node.
+            v (hashable): The second node.
+
+        Returns:
+            bool: True if the edge exists, False otherwise.
+        """
+        if self.is_lazy:
+            index = self._source.index
+            return u in index and v in index and self._source.has_edge(index[u], index[v])
+        return self.graph.has_edge(u, v)
+
+    def get_edge_weight(self, u, v, time=None):
         """
         Retrieve the weight of an edge between two nodes in the graph.
 
         Args:
             u (hashable): The starting node of the edge.
             v (hashable): The ending node of the edge.
+            time (str or int or float, optional): A time of day ("HH:MM" or hours). If given and the graph
+                                                  has a `traffic` profile, the weight at that time is returned.
+                                                  Defaults to None (the base weight).
 
         Returns:
-            int or float: The weight of the edge if it exists, otherwise 0.
+            int or float: The weight of the edge if it exists (-1 if it is blocked), otherwise 0.
         """
-        return self.graph[u][v]['weight'] if self.graph.has_edge(u, v) else 0
-    
+        if not self.has_edge(u, v):
+            return 0
+        if self.is_lazy:
+            index = self._source.index
+            weight = self._source.get_edge_weight(index[u], index[v])
+        else:
+            weight = self.graph[u][v]['weight']
+        if time is None or self.traffic is None:
+            return weight
+        multiplier = self.traffic.multiplier(u, v, time)
+        return -1 if multiplier < 0 or weight < 0 else weight * multiplier
+
+    def compact_at(self, time):
+        """
+        Returns the compact representation of the graph with the weights at a time of day, given by the
+        `traffic` profile. The hourly graphs are always stored as CSR arrays: the node IDs, the row pointers
+        and the column indices are built once and shared by every hour, only the 2m weights (8 bytes each)
+        are allocated per call. So the base weights are kept and every hour can be evaluated on the same graph,
+        without a copy of the n x n matrix of a dense graph per hour.
+        It can be given to the algorithms working on a `CompactGraph` (`ShortestPathOracle`,
+        `Algorithms.compute_total_costs`, ...).
+
+        Args:
+            time (str or int or float): The time of day, "HH:MM" or hours.
+
+        Returns:
+            CompactGraph: The weighted graph at that time, `compact()` itself if there is no profile.
+        """
+        if self.traffic is None:
+            return self.compact()
+        csr, rows = self._traffic_structure()
+        scenario = CompactGraph(
+            csr.nodes,
+            indptr=csr.indptr,
+            indices=csr.indices,
+            weights=self.traffic.weights_at(csr.weights, rows, time),
+            coordinates=csr.coordinates,
+        )
+        scenario._keys = csr._sorted_keys()
+        return scenario
+
+    def _traffic_structure(self):
+        """
+        Returns the CSR form of the graph and the row of the traffic profile of each of its entries,
+        built once for the `compact_at` graphs and cached until the graph or the profile changes.
+        """
+        if self._traffic_csr is None or self._traffic_csr[0] is not self.traffic:
+            compact = self.compact()
+            if compact.is_dense:
+                us, vs, weights = compact.edge_arrays()
+                csr = CompactGraph.from_edges(compact.nodes, us, vs, weights, dense=False,
+                                              coordinates=compact.coordinates)
+            else:
+                csr = compact
+            to_profile = np.array([self.traffic.index[node] for node in csr.nodes], dtype=np.int64)
+            sources = np.repeat(np.arange(len(csr.nodes), dtype=np.int64), np.diff(csr.indptr))
+            rows = self.traffic.edge_ids(to_profile[sources], to_profile[csr.indices])
+            self._traffic_csr = (self.traffic, csr, rows)
+        return self._traffic_csr[1:]
+
+    def compact(self, dense=None):
+        """
+        Returns the integer-indexed, array-backed representation of the graph.
+        It is built on the first call and cached until an edge changes.
+
+        Args:
+            dense (bool, optional): Force the dense (True) or the CSR (False) storage.
+                                    Defaults to None, which picks the storage from the graph density.
+
+        Returns:
+            CompactGraph: The compact representation of the graph.
+        """
+        if self._compact is None and self.is_lazy:
+            self._compact = self._source
+        if self._compact is None or (dense is not None and self._compact.is_dense != dense):
+            compact = CompactGraph.from_graph(self, dense=dense)
+            self._watch_edges()
+            self._compact = compact
+        return self._compact
+
+    def shortest_paths(self):
+        """
+        Returns the shortest path oracle of the graph, working on the integer IDs of `compact()`.
+        It is created on the first call and dropped, like `compact()`, as soon as an edge changes.
+
+        Returns:
+            ShortestPathOracle: The shortest path oracle.
+        """
+        if self._shortest_paths is None:
+            self._shortest_paths = ShortestPathOracle(self.compact())
+        return self._shortest_paths
+
+    def metric_closure(self):
+        """
+        Returns the metric closure of the graph: a complete graph over the same nodes, where the
+        weight of each pair is the length of the shortest path between them. Tours computed on
+        it can be turned back into tours of the graph with `Algorithms.expand_solution`.
+        It is computed once (a dense n x n matrix) and cached until an edge changes.
+
+        Returns:
+            CompactGraph: The dense metric closure, with the same integer IDs as `compact()`.
+                          Pairs that are not connected have no edge.
+        """
+        if self._metric_closure is None:
+            compact = self.compact()
+            distances = self.shortest_paths().distance_matrix()
+            distances[np.isinf(distances)] = np.nan
+            np.fill_diagonal(distances, np.nan)
+            self._metric_closure = CompactGraph(compact.nodes, matrix=distances, coordinates=compact.coordinates)
+        return self._metric_closure
+
+    def shortest_path(self, u, v):
+        """
+        Retrieve the shortest path between two nodes, ignoring blocked edges (negative weight).
+        Repeated queries are answered from the cache of `shortest_paths()`.
+
+        Args:
+            u (hashable): The source node.
+            v (hashable): The target node.
+
+        Returns:
+            list: The nodes of the path, from `u` to `v` included.
+
+        Raises:
+            networkx.NetworkXNoPath: If there is no path between the nodes.
+        """
+        compact = self.compact()
+        try:
+            path = self.shortest_paths().path(compact.index[u], compact.index[v])
+        except nx.NetworkXNoPath:
+            raise nx.NetworkXNoPath(f"No path between {u} and {v}.")
+        return [compact.nodes[i] for i in path]
+
+    def shortest_path_length(self, u, v):
+        """
+        Retrieve the length of the shortest path between two nodes, ignoring blocked edges.
+
+        Args:
+            u (hashable): The source node.
+            v (hashable): The target node.
+
+        Returns:
+            float: The length of the path, infinity if there is no path between the nodes.
+        """
+        compact = self.compact()
+        return self.shortest_paths().distance(compact.index[u], compact.index[v])
+
     def get_neighbors(self, u):
         """
         Retrieve the neighbors of a given node in the graph.
@@ -85,8 +431,80 @@ class Graph:
         Returns:
             list: A list of neighboring nodes connected to the given node.
         """
+        if self.is_lazy:
+            nodes = self._source.nodes
+            return [nodes[i] for i in self._source.get_neighbors(self._source.index[u])]
         return list(self.graph.neighbors(u))
 
+    def get_nodes(self):
+        """
+        Retrieve the nodes of the graph, in the order of their integer IDs in `compact()`.
+
+        Returns:
+            list: The nodes.
+        """
+        return list(self._source.nodes) if self.is_lazy else list(self.graph.nodes)
+
+    def _position(self, node):
+        """
+        Returns the (longitude, latitude) of a node.
+        """
+        return self.positions[node] if self.is_lazy else self.graph.nodes[node]['pos']
+
+    def spatial_index(self):
+        """
+        Returns the spatial index of the node positions, built on first use and cached
+        until the graph changes.
+
+        Returns:
+            tuple: (index, nodes)
+                - index (SpatialIndex): KD-tree over the `pos` (longitude, latitude) of the nodes.
+                - nodes (list): nodes[i] is the node of the i-th indexed position.
+
+        Raises:
+            KeyError: If a node has no 'pos' attribute.
+        """
+        if self._spatial_index is None:
+            nodes = self.get_nodes()
+            coordinates = [self._position(node) for node in nodes]
+            self._spatial_index = (SpatialIndex(coordinates), nodes)
+        return self._spatial_index
+
+    def nearest_nodes(self, node, k=1):
+        """
+        Finds the k nodes geographically closest to a node, whether they are connected to it or not.
+
+        Args:
+            node (hashable): The node to search around.
+            k (int, optional): Number of nodes. Defaults to 1.
+
+        Returns:
+            list: (node, distance) pairs, closest first, with great-circle distances in kilometers.
+                  The node itself is excluded.
+        """
+        index, nodes = self.spatial_index()
+        lon, lat = self._position(node)
+        indices, distances = index.nearest(lon, lat, k + 1)
+        found = [(nodes[i], d) for i, d in zip(indices.tolist(), distances.tolist()) if nodes[i] != node]
+        return found[:k]
+
+    def nodes_within(self, node, radius):
+        """
+        Finds the nodes within a great-circle distance of a node, whether they are connected to it or not.
+
+        Args:
+            node (hashable): The node to search around.
+            radius (float): The distance, in kilometers.
+
+        Returns:
+            list: (node, distance) pairs, closest first, with distances in kilometers.
+                  The node itself is excluded.
+        """
+        index, nodes = self.spatial_index()
+        lon, lat = self._position(node)
+        indices, distances = index.within(lon, lat, radius)
+        return [(nodes[i], d) for i, d in zip(indices.tolist(), distances.tolist()) if nodes[i] != node]
+
     def set_tsp_path(self, vehicle_id, path):
         """
         Sets the Traveling Salesman Problem (TSP) path for a specific vehicle.
@@ -139,13 +557,70 @@ class Graph:
             pickle.dump(self, f)
         print(f"Graph serialized and saved to {filepath}")
 
+    def save_arrays(self, directory):
+        """
+        Saves the nodes, coordinates and weighted edges of the graph as a directory of .npy arrays
+        (see `CompactGraph.save`), which `load` reads much faster than a pickle. The TSP paths and the
+        traffic profile are not saved.
+
+        Args:
+            directory (str): The directory, created if needed.
+
+        Returns:
+            None
+        """
+        self.compact().save(directory)
+        print(f"Graph arrays saved to {directory}")
+
+    @staticmethod
+    def convert_pickle(filepath, directory=None):
+        """
+        Converts a pickled graph (such as the .pkl files of data/datasets) into the array format.
+
+        Args:
+            filepath (str): The path to the .pkl file.
+            directory (str, optional): The output directory. Defaults to the path without its extension.
+
+        Returns:
+            str: The output directory.
+        """
+        if directory is None:
+            directory = os.path.splitext(filepath)[0]
+        Graph.load(filepath).save_arrays(directory)
+        return directory
+
     @staticmethod
-    def load(filepath):
+    def from_compact(compact, lazy=True):
         """
-        Deserializes and loads a graph object from a specified file.
+        Builds a graph from a compact graph, which becomes its `compact()` representation.
 
         Args:
-            filepath (str): The path to the file containing the serialized graph object.
+            compact (CompactGraph): The compact graph.
+            lazy (bool, optional): Serve the weights, neighbors and distances from the compact graph and
+                                   only build the networkx graph on first access to `graph`. Defaults to True.
+
+        Returns:
+            Graph: The graph.
+        """
+        graph = Graph()
+        if compact.coordinates is not None:
+            graph.positions = dict(zip(compact.nodes, map(tuple, np.asarray(compact.coordinates).tolist())))
+        graph._graph = None
+        graph._source = compact
+        if not lazy:
+            graph._materialize()
+        return graph
+
+    @staticmethod
+    def load(filepath, lazy=True):
+        """
+        Deserializes and loads a graph object from a specified file, or from a directory of arrays
+        written by `save_arrays` (memory-mapped, and much faster for large graphs).
+
+        Args:
+            filepath (str): The path to the file containing the serialized graph object, or to the directory.
+            lazy (bool, optional): For a directory, only build the networkx graph on first access to `graph`
+                                   (see `from_compact`). Defaults to True.
 
         Returns:
             object: The deserialized graph object.
@@ -158,8 +633,11 @@ class Graph:
         Example:
             graph = load('/path/to/graph.pkl')
         """
-        with open(filepath, 'rb') as f:
-            graph = pickle.load(f)
+        if os.path.isdir(filepath):
+            graph = Graph.from_compact(CompactGraph.load(filepath), lazy=lazy)
+        else:
+            with open(filepath, 'rb') as f:
+                graph = pickle.load(f)
         print(f"Graph deserialized from {filepath}")
         return graph
     
@@ -437,7 +915,7 @@ class Graph:
         """
         return geodesic(coord1, coord2).kilometers
 
-    def generate_geo_graph(self, n, density=0.1):
+    def generate_geo_graph(self, n, density=0.1, distance_method="geodesic", seed=None):
         """
         Generates a geographical graph based on a list of cities with their coordinates.
         This method reads a file containing geographical data, filters for populated places,
@@ -450,6 +928,10 @@ class Graph:
             n (int): Number of cities to include in the graph.
             density (float, optional): The density of the graph, determining the proportion 
                 of possible edges to include. Defaults to 0.1.
+            distance_method (str, optional): "geodesic" for edge weights matching geopy's geodesic,
+                or "haversine" for faster spherical distances. Defaults to "geodesic".
+            seed (int, optional): Seed of the additional edges, the same inputs and seed always
+                give the same graph. Defaults to None, which draws it from the `random` module.
         Raises:
             ValueError: If the file contains fewer valid cities than the requested number `n`.
         Attributes:
@@ -460,29 +942,155 @@ class Graph:
             - The geonames file is expected to be a tab-separated file with specific columns.
             - Only cities with valid latitude and longitude values are considered.
             - The graph is initialized with a minimal spanning tree to ensure connectivity.
-            - Additional edges are added randomly to achieve the desired density.
-        """
-        df = pd.read_csv(
-            #geonames_path,
-            "../data/FR/cities_of_france.txt", 
-            sep='\t', 
-            header=None,
-            names=["geonameid", "name", "asciiname", "alternatenames", "latitude", "longitude", 
-                "feature_class", "feature_code", "country_code", "cc2", "admin1_code", 
-                "admin2_code", "admin3_code", "admin4_code", "population", "elevation", 
-                "dem", "timezone", "modification_date"]
-        )
+            - Additional edges are drawn randomly, exactly as many as needed to achieve the desired density.
+            - Edge weights are computed in one vectorized batch once all the edges are chosen.
+        """
+        self._add_city_nodes(Graph._sample_cities(n))
 
-        # Filter cities with valid coordinates
-        df = df[df['feature_class'] == 'P']  # P = populated place
-        df = df.dropna(subset=['latitude', 'longitude'])
+        # Generate a minimal edge to make the graph connected (MST)
+        cities = list(self.graph.nodes)
+        edges = [(cities[i], cities[i + 1]) for i in range(len(cities) - 1)]
 
-        # Check if the file contains enough cities
-        if len(df) < n:
-            raise ValueError(f"The file contains only {len(df)} valid cities, but {n} are requested.")
+        # Add additional edges based on density, drawn without any rejection loop
+        max_edges = int(len(cities) * (len(cities) - 1) / 2 * density)
+        rng = np.random.default_rng(seed if seed is not None else random.getrandbits(64))
+        extra_u, extra_v = Graph._sample_extra_edges(len(cities), max_edges - len(edges), rng)
+        edges.extend((cities[i], cities[j]) for i, j in zip(extra_u.tolist(), extra_v.tolist()))
 
-        # Select n random cities
-        df_sample = df.sample(n=n, random_state=42).reset_index(drop=True)
+        # All the weights are computed in one batch
+        self._add_edges_with_geo_weights(edges, distance_method)
+
+        self._reset_caches()
+
+    def generate_geometric_graph(self, n, k=8, radius=None, distance_method="geodesic"):
+        """
+        Generates a geographical graph on the same cities as `generate_geo_graph`, where each city is
+        connected to its geographic neighbors instead of random (mostly long-range) cities, like a road network.
+        Neighbors come from the spatial index, so building the graph is O(n log n) instead of O(n^2).
+
+        Args:
+            n (int): Number of cities to include in the graph.
+            k (int, optional): Each city is connected to its k nearest cities. Defaults to 8.
+            radius (float, optional): If given, each city is connected to every city within this
+                distance in kilometers instead, and `k` is ignored. Defaults to None.
+            distance_method (str, optional): "geodesic" or "haversine", see `generate_geo_graph`.
+                Defaults to "geodesic".
+
+        Raises:
+            ValueError: If the file contains fewer valid cities than the requested number `n`.
+
+        Notes:
+            - The graph is made connected by linking each connected component to the closest city
+              outside of it (among the LINK_NEIGHBORS nearest cities of its cities), until there is
+              only one component left.
+        """
+        self._add_city_nodes(Graph._sample_cities(n))
+        self._add_geometric_edges(k, radius, distance_method)
+
+    def _add_geometric_edges(self, k=8, radius=None, distance_method="geodesic"):
+        """
+        Connects every node to its k nearest nodes (or to the nodes within `radius` kilometers),
+        then links the connected components together so that the graph is connected.
+
+        Args:
+            k (int, optional): Number of nearest nodes. Defaults to 8.
+            radius (float, optional): Distance in kilometers, replaces `k` if given. Defaults to None.
+            distance_method (str, optional): "geodesic" or "haversine". Defaults to "geodesic".
+        """
+        index, nodes = self.spatial_index()
+        if radius is None:
+            neighbors, _ = index.nearest_all(k)
+            pairs = {(min(i, j), max(i, j)) for i, row in enumerate(neighbors.tolist()) for j in row}
+        else:
+            pairs = set()
+            for i, node in enumerate(nodes):
+                lon, lat = self._position(node)
+                pairs.update((i, j) for j in index.within(lon, lat, radius)[0].tolist() if i < j)
+        self._add_edges_with_geo_weights([(nodes[i], nodes[j]) for i, j in sorted(pairs)], distance_method)
+
+        # Each component but the largest is linked to the closest node outside of it, which at least
+        # halves the number of components in each round. The candidates are the LINK_NEIGHBORS nearest
+        # nodes of its nodes, found in one batch; the tree is only searched further for a component
+        # that none of them leaves.
+        neighbors, distances = index.nearest_all(LINK_NEIGHBORS)
+        position = {node: i for i, node in enumerate(nodes)}
+        labels = np.empty(len(nodes), dtype=np.int64)
+        components = sorted(nx.connected_components(self.graph), key=len)
+        while len(components) > 1:
+            for label, component in enumerate(components):
+                labels[[position[node] for node in component]] = label
+            foreign = labels[neighbors] != labels[:, None]
+            first = foreign.argmax(axis=1)
+            link_distances = np.where(foreign.any(axis=1), distances[np.arange(len(nodes)), first], np.inf)
+
+            links = []
+            for label, component in enumerate(components[:-1]):
+                members = np.flatnonzero(labels == label)
+                i = members[np.argmin(link_distances[members])]
+                if np.isfinite(link_distances[i]):
+                    links.append((nodes[i], nodes[neighbors[i, first[i]]]))
+                else:
+                    links.append(self._closest_outside(index, nodes, component, set(members.tolist())))
+            self._add_edges_with_geo_weights(links, distance_method)
+            components = sorted(nx.connected_components(self.graph), key=len)
+
+        self._reset_caches()
+
+    def _closest_outside(self, index, nodes, component, members):
+        """
+        Finds the closest pair of nodes between a component and the rest of the graph.
+
+        Args:
+            index (SpatialIndex): The spatial index of the graph.
+            nodes (list): nodes[i] is the node of the i-th indexed position.
+            component (set): The nodes of the component.
+            members (set): Their positions in the index.
+
+        Returns:
+            tuple: (node, other), the node of the component and the node outside of it.
+        """
+        best = None
+        for node in component:
+            lon, lat = self._position(node)
+            # The neighbors are fetched by doubling batches, until one is outside of the component
+            # or all the next ones are farther than the best pair found so far
+            k = 2 * LINK_NEIGHBORS
+            while True:
+                found, distances = index.nearest(lon, lat, k)
+                outside = next((p for p, j in enumerate(found.tolist()) if j not in members), None)
+                if outside is not None:
+                    if best is None or distances[outside] < best[0]:
+                        best = (distances[outside], node, nodes[found[outside]])
+                    break
+                if best is not None and distances[-1] >= best[0]:
+                    break
+                k *= 2
+        return best[1:]
+
+    @staticmethod
+    def _sample_cities(n):
+        """
+        Selects `n` populated places of the geonames file (GEONAMES_PATH), always the same ones for a given `n`.
+        The file is only parsed on the first call, see `cities.load_cities`.
+
+        Args:
+            n (int): Number of cities.
+
+        Returns:
+            pandas.DataFrame: The selected cities, with their 'name', 'latitude' and 'longitude'.
+
+        Raises:
+            ValueError: If the file contains fewer valid cities than the requested number `n`.
+        """
+        return sample_cities(n)
+
+    def _add_city_nodes(self, df_sample):
+        """
+        Replaces the graph with one node per city, without edges.
+
+        Args:
+            df_sample (pandas.DataFrame): The cities, as returned by `_sample_cities`.
+        """
         self.graph = nx.Graph()
         self.positions = {}
 
@@ -493,22 +1101,73 @@ class Graph:
             lon = row['longitude']
             self.graph.add_node(city, pos=(lon, lat))  # Note: x = lon, y = lat
             self.positions[city] = (lon, lat)
+        self._reset_caches()
 
-        # Generate a minimal edge to make the graph connected (MST)
-        cities = list(self.graph.nodes)
-        if len(cities) > 1:  # Ensure there are at least 2 cities
-            for i in range(len(cities) - 1):
-                city1, city2 = cities[i], cities[i + 1]
-                self._add_edge_with_geo_weight(city1, city2)
+    @staticmethod
+    def _sample_extra_edges(n, k, rng):
+        """
+        Draws exactly `k` distinct node pairs among the pairs (i, j) with j >= i + 2, that is every
+        pair except the (i, i + 1) edges of the initial path. Pairs are drawn as indices in the
+        triangular pair space and decoded with index arithmetic, so there is no rejection loop.
+        When more than half of the pairs are requested, the pairs to leave out are drawn instead.
 
-        # Add additional edges based on density
-        max_edges = int(len(cities) * (len(cities) - 1) / 2 * density)
-        added = set(self.graph.edges)
-        while len(self.graph.edges) < max_edges:
-            u, v = random.sample(cities, 2)
-            if (u, v) not in added and (v, u) not in added:
-                self._add_edge_with_geo_weight(u, v)
-                added.add((u, v))
+        Args:
+            n (int): Number of nodes.
+            k (int): Number of pairs to draw, clipped to the number of available pairs.
+            rng (numpy.random.Generator): The random generator to draw from.
+
+        Returns:
+            tuple: (u, v), two integer arrays of length k with u < v, sorted by (u, v).
+        """
+        total = max(n - 1, 0) * max(n - 2, 0) // 2
+        k = min(max(k, 0), total)
+
+        if k > total // 2:
+            # Dense graphs: draw the complement and keep everything else
+            keep = np.ones(total, dtype=bool)
+            keep[rng.choice(total, size=total - k, replace=False)] = False
+            t = np.flatnonzero(keep)
+        else:
+            t = np.sort(rng.choice(total, size=k, replace=False))
+
+        # Row i holds the pairs (i, i + 2), ..., (i, n - 1) and starts at index i * (2n - 3 - i) / 2
+        def row_start(i):
+            return i * (2 * n - 3 - i) // 2
+
+        b = 2 * n - 3
+        i = np.floor((b - np.sqrt(np.maximum(b * b - 8 * t, 0))) / 2).astype(np.int64)
+        # Fix the rounding errors of the square root
+        i = np.clip(i, 0, max(n - 3, 0))
+        i -= row_start(i) > t
+        i += row_start(i + 1) <= t
+        j = t - row_start(i) + i + 2
+        return i, j
+
+    def _add_edges_with_geo_weights(self, edges, distance_method="geodesic"):
+        """
+        Adds edges between nodes of the graph with weights based on the distance between
+        their geographical positions. All the distances are computed in one vectorized batch.
+
+        Args:
+            edges (list): A list of (u, v) node pairs.
+            distance_method (str, optional): "geodesic" (matches geopy's geodesic) or "haversine".
+                                             Defaults to "geodesic".
+
+        Raises:
+            KeyError: If a node does not exist in the graph or if its 'pos' attribute is missing.
+        """
+        if not edges:
+            return
+
+        nodes = self.graph.nodes
+        pos_u = np.array([nodes[u]['pos'] for u, _ in edges], dtype=np.float64)
+        pos_v = np.array([nodes[v]['pos'] for _, v in edges], dtype=np.float64)
+        # Positions are (lon, lat)
+        weights = geo_distances(pos_u[:, 1], pos_u[:, 0], pos_v[:, 1], pos_v[:, 0], method=distance_method)
+
+        self.graph.add_weighted_edges_from(
+            (u, v, round(weight, 2)) for (u, v), weight in zip(edges, weights.tolist())
+        )
 
     def _add_edge_with_geo_weight(self, u, v):
         """
@@ -528,11 +1187,11 @@ class Graph:
             KeyError: If either node `u` or `v` does not exist in the graph or 
                       if their 'pos' attribute is missing.
         """
-        from geopy.distance import geodesic
         pos_u = self.graph.nodes[u]['pos']
         pos_v = self.graph.nodes[v]['pos']
         weight = geodesic((pos_u[1], pos_u[0]), (pos_v[1], pos_v[0])).kilometers
         self.graph.add_edge(u, v, weight=round(weight, 2))
+        self._reset_caches()
 
     def plot_geo_graph(self, map_background=True):
         """
@@ -0,0 +1,236 @@
+from collections import deque
+import numpy as np
+
+# Number of nearest neighbors each node tries moves with
+NUM_NEIGHBORS = 10
+
+# Moves must improve the cost by more than this to be applied, against floating point noise
+EPSILON = 1e-9
+
+
+class LocalSearch:
+    def __init__(self, compact, num_neighbors=NUM_NEIGHBORS, keep_routes=False):
+        """
+        Local search engine for multi-vehicle solutions on a complete graph, such as `Graph.metric_closure()`.
+
+        Each node only tries moves towards its `num_neighbors` nearest neighbors (candidate lists), so a
+        pass over the nodes is O(n * k) instead of O(n^2). Nodes whose neighborhood did not change since
+        they last failed to improve are skipped (don't-look bits). The moves are:
+            - relocate: move a node after or before a neighbor, in the same or in another tour,
+            - exchange: swap a node with a neighbor,
+            - 2-opt: reverse the part of a tour between a node and a neighbor,
+            - 2-opt*: exchange the ends of two tours after a node and a neighbor,
+            - Or-opt: move a sequence of 2 or 3 nodes after a neighbor, possibly reversed.
+        With `keep_routes=True`, moves that would leave a route without any node are not applied.
+
+        Attributes:
+            compact (CompactGraph): The complete graph, with integer node IDs.
+            neighbors (list): neighbors[i] lists the nearest neighbors of i, closest first.
+            keep_routes (bool): Never empty a route.
+        """
+        self.compact = compact
+        self.keep_routes = keep_routes
+        self.neighbors = self._nearest_neighbors(num_neighbors)
+
+    def _nearest_neighbors(self, k):
+        """
+        Computes the candidate lists from the dense weight matrix, a block of rows at a time.
+        """
+        matrix = self.compact.matrix
+        n = matrix.shape[0]
+        k = min(k, n - 1)
+        if k <= 0:
+            return [[] for _ in range(n)]
+
+        neighbors = []
+        block = max(1, 2 ** 22 // n)
+        for start in range(0, n, block):
+            rows = matrix[start:start + block]
+            rows = np.where(np.isnan(rows), np.inf, rows)
+            rows[np.arange(len(rows)), np.arange(start, start + len(rows))] = np.inf
+            nearest = np.argpartition(rows, k - 1, axis=1)[:, :k]
+            order = np.take_along_axis(rows, nearest, axis=1).argsort(axis=1)
+            neighbors.extend(np.take_along_axis(nearest, order, axis=1).tolist())
+        return neighbors
+
+    def improve(self, solution, max_moves=None):
+        """
+        Improves a solution until no move of the neighborhood improves it (or `max_moves` moves were applied).
+        The tours must not visit a node twice, apart from the depot at both ends.
+
+        Args:
+            solution (dict): Keys are vehicle IDs and values are tours of integer IDs, starting and ending at the depot.
+            max_moves (int, optional): Maximum number of moves to apply. Defaults to None (no limit).
+
+        Returns:
+            tuple: (solution, gain)
+                - solution (dict): The improved solution, a new dictionary.
+                - gain (float): Cost of the given solution minus cost of the improved one.
+        """
+        self._routes = {vehicle_id: list(tour) for vehicle_id, tour in solution.items()}
+        self._where = {}
+        for vehicle_id in self._routes:
+            self._index_route(vehicle_id)
+        depots = {tour[0] for tour in self._routes.values()}
+
+        gain = 0.0
+        moves = 0
+        round_moves = None
+        # Reversals and tail exchanges also change the neighborhood of nodes that are not looked at
+        # again, so rounds over all the nodes are repeated until one of them finds nothing
+        while round_moves != 0 and (max_moves is None or moves < max_moves):
+            round_moves = 0
+            queue = deque(self._where)
+            active = set(self._where)
+            while queue and (max_moves is None or moves < max_moves):
+                node = queue.popleft()
+                active.discard(node)
+                improvement = self._improve_node(node, depots)
+                if improvement is None:
+                    continue
+                delta, touched = improvement
+                gain -= delta
+                moves += 1
+                round_moves += 1
+                # Don't-look bits: the nodes around the changed edges are looked at again
+                for other in touched:
+                    if other in self._where and other not in active:
+                        active.add(other)
+                        queue.append(other)
+
+        routes = self._routes
+        self._routes = self._where = None
+        return routes, gain
+
+    def _index_route(self, vehicle_id):
+        """
+        Records the (route, position) of the nodes of a route, the depot excluded.
+        """
+        tour = self._routes[vehicle_id]
+        for k in range(1, len(tour) - 1):
+            self._where[tour[k]] = (vehicle_id, k)
+
+    def _improve_node(self, u, depots):
+        """
+        Applies the first improving move involving `u` and one of its candidates.
+
+        Returns:
+            tuple or None: (delta, touched) where `touched` are the nodes around the changed edges,
+                           or None if no move improves the solution.
+        """
+        d = self.compact.get_edge_weight
+        routes, where = self._routes, self._where
+        ru, iu = where[u]
+        route_u = routes[ru]
+        pu, su = route_u[iu - 1], route_u[iu + 1]
+        removal = d(pu, su) - d(pu, u) - d(u, su)
+        # Moving u, or a sequence of `length` nodes, out of its route would empty it
+        keep_routes = self.keep_routes
+        size_u = len(route_u) - 2
+
+        for v in self.neighbors[u]:
+            if v in depots or v not in where:
+                continue
+            rv, iv = where[v]
+            route_v = routes[rv]
+            pv, sv = route_v[iv - 1], route_v[iv + 1]
+            same = ru == rv
+            can_leave = same or not keep_routes or size_u > 1
+
+            # Relocate u after v
+            if can_leave and not (same and v == pu):
+                delta = removal + d(v, u) + d(u, sv) - d(v, sv)
+                if delta < -EPSILON:
+                    self._relocate(ru, iu, rv, v, after=True)
+                    return delta, (u, pu, su, v, sv)
+
+            # Relocate u before v
+            if can_leave and not (same and v == su):
+                delta = removal + d(pv, u) + d(u, v) - d(pv, v)
+                if delta < -EPSILON:
+                    self._relocate(ru, iu, rv, v, after=False)
+                    return delta, (u, pu, su, v, pv)
+
+            # Exchange u and v
+            if same:
+                i, j = min(iu, iv), max(iu, iv)
+                a, b = route_u[i], route_u[j]
+                prev_a, next_b = route_u[i - 1], route_u[j + 1]
+                if j == i + 1:
+                    delta = d(prev_a, b) + d(a, next_b) - d(prev_a, a) - d(b, next_b)
+                else:
+                    next_a, prev_b = route_u[i + 1], route_u[j - 1]
+                    delta = (d(prev_a, b) + d(b, next_a) + d(prev_b, a) + d(a, next_b)
+                             - d(prev_a, a) - d(a, next_a) - d(prev_b, b) - d(b, next_b))
+            else:
+                delta = (d(pu, v) + d(v, su) - d(pu, u) - d(u, su)
+                         + d(pv, u) + d(u, sv) - d(pv, v) - d(v, sv))
+            if delta < -EPSILON:
+                route_u[iu], route_v[iv] = v, u
+                where[u], where[v] = (rv, iv), (ru, iu)
+                return delta, (u, pu, su, v, pv, sv)
+
+            # 2-opt (same tour) or 2-opt* (two tours): new edges (u, v) and (su, sv)
+            # (2-opt* empties the route of v if u and v are both the last nodes of their tours)
+            if v != su and u != sv and (same or not keep_routes or not (su in depots and sv in depots)):
+                delta = d(u, v) + d(su, sv) - d(u, su) - d(v, sv)
+                if delta < -EPSILON:
+                    if same:
+                        i, j = min(iu, iv), max(iu, iv)
+                        route_u[i + 1:j + 1] = route_u[i + 1:j + 1][::-1]
+                    else:
+                        # u is followed by the start of v's tour reversed, the end of u's tour reversed by sv
+                        routes[ru] = route_u[:iu + 1] + route_v[iv:0:-1] + [route_u[-1]]
+                        routes[rv] = [route_v[0]] + route_u[-2:iu:-1] + route_v[iv + 1:]
+                        self._index_route(rv)
+                    self._index_route(ru)
+                    return delta, (u, su, v, sv)
+
+            # Or-opt: the sequence starting at u moved after v, possibly reversed
+            for length in (2, 3):
+                end = iu + length - 1
+                if end > len(route_u) - 2:
+                    break
+                if same and iu - 1 <= iv <= end:
+                    continue
+                if not same and keep_routes and length == size_u:
+                    continue
+                last, after = route_u[end], route_u[end + 1]
+                cut = d(pu, after) - d(pu, u) - d(last, after)
+                forward = cut + d(v, u) + d(last, sv) - d(v, sv)
+                backward = cut + d(v, last) + d(u, sv) - d(v, sv)
+                delta = min(forward, backward)
+                if delta < -EPSILON:
+                    self._move_sequence(ru, iu, end, rv, v, reverse=backward < forward)
+                    return delta, (u, last, pu, after, v, sv)
+
+        return None
+
+    def _relocate(self, ru, iu, rv, v, after):
+        """
+        Moves the node at position `iu` of route `ru` after (or before) the node `v` of route `rv`.
+        """
+        route_u = self._routes[ru]
+        u = route_u.pop(iu)
+        route_v = self._routes[rv]
+        iv = route_v.index(v) if ru == rv else self._where[v][1]
+        route_v.insert(iv + 1 if after else iv, u)
+        self._index_route(ru)
+        if rv != ru:
+            self._index_route(rv)
+
+    def _move_sequence(self, ru, start, end, rv, v, reverse):
+        """
+        Moves the nodes at positions `start` to `end` of route `ru` after the node `v` of route `rv`.
+        """
+        route_u = self._routes[ru]
+        sequence = route_u[start:end + 1]
+        del route_u[start:end + 1]
+        if reverse:
+            sequence.reverse()
+        route_v = self._routes[rv]
+        iv = route_v.index(v) if ru == rv else self._where[v][1]
+        route_v[iv + 1:iv + 1] = sequence
+        self._index_route(ru)
+        if rv != ru:
+            self._index_route(rv)
@@ -0,0 +1,354 @@
+import math
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+import numpy as np
+from algorithms import Algorithms
+from compact_graph import CompactGraph
+
+# Arrays holding the structure of a CompactGraph, the ones that are None are not shared
+SHARED_ARRAYS = ("matrix", "indptr", "indices", "weights", "coordinates")
+
+# Graph attached by the initializer of each worker process
+_worker_graph = None
+_worker_blocks = None
+# Event telling the runs of a worker process to stop early
+_worker_stop = None
+
+
+class SharedCompactGraph:
+    def __init__(self, compact):
+        """
+        Copies the arrays of a `CompactGraph` into shared memory blocks, so that worker processes can
+        attach the graph once instead of receiving a pickled copy with every task.
+        The blocks must be released with `close` (or by using the object as a context manager)
+        once the workers are done.
+
+        Attributes:
+            spec (dict): What a worker needs to attach the graph with `attach_compact`: the number of
+                         nodes and, for each array, the name of its block, its shape and its dtype.
+        """
+        self._blocks = []
+        arrays = {}
+        for name in SHARED_ARRAYS:
+            array = getattr(compact, name)
+            if array is None:
+                continue
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            self._blocks.append(block)
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            arrays[name] = (block.name, array.shape, array.dtype.str)
+        self.spec = {"n": compact.number_of_nodes(), "arrays": arrays}
+
+    def close(self):
+        """
+        Releases the shared memory blocks.
+        """
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def attach_compact(spec):
+    """
+    Rebuilds a `CompactGraph` on top of the shared memory blocks described by `SharedCompactGraph.spec`.
+    Nodes are named by their integer ID, solutions are encoded and decoded by the parent process.
+
+    Args:
+        spec (dict): The `spec` attribute of a `SharedCompactGraph`.
+
+    Returns:
+        tuple: (compact, blocks), the blocks must stay referenced as long as the graph is used.
+    """
+    blocks = []
+    arrays = {}
+    for name, (block_name, shape, dtype) in spec["arrays"].items():
+        block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    return CompactGraph(range(spec["n"]), **arrays), blocks
+
+
+def _init_worker(spec):
+    """
+    Initializer of the worker processes: attaches the shared graph once per process.
+    """
+    global _worker_graph, _worker_blocks
+    _worker_graph, _worker_blocks = attach_compact(spec)
+
+
+def _anneal_replica(solution, temp, iterations, seed):
+    """
+    Runs `iterations` Metropolis steps at a fixed temperature on the graph of the worker.
+
+    Returns:
+        tuple: (solution, cost, best_solution, best_cost) at the end of the run.
+    """
+    compact = _worker_graph
+    current_cost = Algorithms.compute_total_cost(compact, solution)
+    best_solution, _, _, best_is_current, _, _ = Algorithms.metropolis_steps(
+        compact, solution, temp, iterations, random.Random(seed), current_cost, None, current_cost, True
+    )
+
+    if best_is_current:
+        best_solution = Algorithms.copy_solution(solution)
+    # Costs were accumulated from deltas, recompute them to drop the floating point drift
+    return (solution, Algorithms.compute_total_cost(compact, solution),
+            best_solution, Algorithms.compute_total_cost(compact, best_solution))
+
+
+def parallel_tempering(graph, min_temp, max_temp, num_replicas, num_vehicles, rounds, iterations_per_round,
+                       metric_closure=False, max_workers=None, seed=None, initialization="random"):
+    """
+    Parallel tempering (replica exchange) version of `Algorithms.simulated_annealing`.
+    `num_replicas` replicas of the solution are annealed at fixed temperatures spread geometrically
+    between `min_temp` and `max_temp`, each in a worker process. After each round of
+    `iterations_per_round` moves, replicas at neighboring temperatures exchange their solutions with
+    the Metropolis criterion, so that good solutions found at high temperature get refined at low
+    temperature. The graph is shared with the workers through shared memory.
+
+    Args:
+        graph (Graph): The graph object.
+        min_temp (float): Temperature of the coldest replica.
+        max_temp (float): Temperature of the hottest replica.
+        num_replicas (int): Number of replicas.
+        num_vehicles (int): Number of vehicles.
+        rounds (int): Number of exchange rounds.
+        iterations_per_round (int): Number of moves tried by each replica between two exchanges.
+        metric_closure (bool, optional): Search on `Graph.metric_closure`, as in `simulated_annealing`. Defaults to False.
+        max_workers (int, optional): Number of worker processes. Defaults to one per replica, at most one per CPU.
+        seed (int, optional): Seed of the depot choice, of the exchanges and of the replicas. Defaults to None.
+        initialization (str, optional): Strategy of `Algorithms.initialize_solution`. Defaults to "random".
+
+    Returns:
+        tuple: (best_solution, elapsed_time)
+    """
+    start_time = time.perf_counter()
+    rng = random.Random(seed)
+
+    nodes = graph.get_nodes()
+    start_node = rng.choice(nodes)
+    nodes.remove(start_node)
+
+    if metric_closure:
+        compact = graph.metric_closure()
+        initial_solution = Algorithms.initialize_solution(
+            [compact.index[node] for node in nodes], compact.index[start_node], num_vehicles, compact, rng, initialization
+        )
+    else:
+        compact = graph.compact()
+        initial_solution = compact.encode_solution(
+            Algorithms.initialize_solution(nodes, start_node, num_vehicles, graph, rng, initialization)
+        )
+
+    # Coldest replica first
+    if num_replicas > 1:
+        ratio = (max_temp / min_temp) ** (1 / (num_replicas - 1))
+        temperatures = [min_temp * ratio ** k for k in range(num_replicas)]
+    else:
+        temperatures = [min_temp]
+    # states[k] is the (solution, cost) of the replica at temperatures[k]
+    initial_cost = Algorithms.compute_total_cost(compact, initial_solution)
+    states = [(Algorithms.copy_solution(initial_solution), initial_cost) for _ in temperatures]
+    best_solution, best_cost = initial_solution, initial_cost
+
+    if max_workers is None:
+        max_workers = min(num_replicas, os.cpu_count() or 1)
+
+    with SharedCompactGraph(compact) as shared:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(shared.spec,)) as pool:
+            for round_number in range(rounds):
+                futures = [
+                    pool.submit(_anneal_replica, solution, temp, iterations_per_round, rng.getrandbits(64))
+                    for (solution, _), temp in zip(states, temperatures)
+                ]
+                states = []
+                for future in futures:
+                    solution, cost, replica_best, replica_best_cost = future.result()
+                    states.append((solution, cost))
+                    if replica_best_cost < best_cost:
+                        best_solution, best_cost = replica_best, replica_best_cost
+
+                # Exchange between neighbors, alternating the even and the odd pairs
+                for k in range(round_number % 2, num_replicas - 1, 2):
+                    exponent = (1 / temperatures[k] - 1 / temperatures[k + 1]) * (states[k][1] - states[k + 1][1])
+                    if exponent >= 0 or rng.random() < math.exp(exponent):
+                        states[k], states[k + 1] = states[k + 1], states[k]
+
+    best_solution = compact.decode_solution(best_solution)
+    if metric_closure:
+        best_solution = Algorithms.expand_solution(graph, best_solution)
+    graph.tsp_paths = {}
+    for vehicle_id, path in best_solution.items():
+        graph.set_tsp_path(vehicle_id, path)
+
+    if not Algorithms.validate_solution(graph, best_solution):
+        raise ValueError("The solution is invalid: some edges do not exist or tours are incomplete.")
+
+    best_cost = Algorithms.compute_total_cost(graph, best_solution)
+    elapsed_time = time.perf_counter() - start_time
+    print(f"Final solution cost: {best_cost:.2f}")
+    print(f"Elapsed time: {elapsed_time:.2f} seconds")
+    return best_solution, elapsed_time
+
+
+def _init_annealing_worker(graph, stop):
+    """
+    Initializer of the worker processes of `multi_start_annealing`: receives the graph once per process.
+    """
+    global _worker_graph, _worker_stop
+    _worker_graph, _worker_stop = graph, stop
+
+
+def _run_annealing(run, seed, parameters):
+    """
+    Runs one seeded simulated annealing on the graph of the worker.
+
+    Returns:
+        tuple: (run, seed, solution, cost, elapsed_time)
+    """
+    solution, elapsed_time = Algorithms.simulated_annealing(_worker_graph, seed=seed, stop=_worker_stop, **parameters)
+    return run, seed, solution, Algorithms.compute_total_cost(_worker_graph, solution), elapsed_time
+
+
+def multi_start_annealing(graph, num_runs, initial_temp, min_temp, cooling_rate, max_iterations, num_vehicles,
+                          metric_closure=False, seed=None, target_cost=None, max_workers=None, callback=None,
+                          schedule="geometric", time_limit=None):
+    """
+    Runs `num_runs` independent simulated annealings with different seeds in a process pool and keeps the best one.
+    The seed of each run is drawn from `seed`, so the whole batch is reproducible, and any single run can be
+    replayed with `Algorithms.simulated_annealing(..., seed=result["seed"])`.
+
+    Args:
+        graph (Graph): The graph object.
+        num_runs (int): Number of runs.
+        initial_temp (float): Initial temperature of each run.
+        min_temp (float): Final temperature of each run.
+        cooling_rate (float): Cooling rate of each run.
+        max_iterations (int): Number of moves tried at each temperature.
+        num_vehicles (int): Number of vehicles.
+        metric_closure (bool, optional): Search on `Graph.metric_closure`, as in `simulated_annealing`. Defaults to False.
+        seed (int, optional): Seed the seeds of the runs are drawn from. Defaults to None.
+        target_cost (float, optional): As soon as a run reaches this cost, the pending runs are cancelled and the
+                                       running ones stop at their next temperature step. Defaults to None.
+        max_workers (int, optional): Number of worker processes. Defaults to one per CPU.
+        callback (callable, optional): Called in this process with the result of each run as soon as it completes.
+        schedule (str, optional): Cooling schedule of each run, "geometric" or "adaptive", as in
+                                  `simulated_annealing`. Defaults to "geometric".
+        time_limit (float, optional): Maximum duration of each run, in seconds. Defaults to None.
+
+    Returns:
+        tuple: (best_solution, results)
+            - best_solution (dict): The best solution over all the runs.
+            - results (list): One dict per completed run, in the order of the runs, with its "run" number,
+                              its "seed", its "cost" and its "elapsed_time".
+    """
+    rng = random.Random(seed)
+    seeds = [rng.getrandbits(32) for _ in range(num_runs)]
+    parameters = {
+        "initial_temp": initial_temp,
+        "min_temp": min_temp,
+        "cooling_rate": cooling_rate,
+        "max_iterations": max_iterations,
+        "num_vehicles": num_vehicles,
+        "metric_closure": metric_closure,
+        "schedule": schedule,
+        "time_limit": time_limit,
+    }
+
+    context = multiprocessing.get_context()
+    stop = context.Event()
+    results = []
+    best = None
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context,
+                             initializer=_init_annealing_worker, initargs=(graph, stop)) as pool:
+        futures = [pool.submit(_run_annealing, run, run_seed, parameters) for run, run_seed in enumerate(seeds)]
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            run, run_seed, solution, cost, elapsed_time = future.result()
+            result = {"run": run, "seed": run_seed, "cost": cost, "elapsed_time": elapsed_time}
+            results.append(result)
+            if callback is not None:
+                callback(result)
+
+            # Ties are broken by run number, so that the result does not depend on the completion order
+            if best is None or (cost, run) < (best[0], best[1]):
+                best = (cost, run, solution)
+
+            if target_cost is not None and cost <= target_cost and not stop.is_set():
+                stop.set()
+                for pending in futures:
+                    pending.cancel()
+
+    best_solution = best[2]
+    graph.tsp_paths = {}
+    for vehicle_id, path in best_solution.items():
+        graph.set_tsp_path(vehicle_id, path)
+
+    results.sort(key=lambda result: result["run"])
+    return best_solution, results
+
+
+def _make_offspring(pairs, mutation_rate, crossover, seeds):
+    """
+    Builds the offspring of a chunk of parent pairs on the graph of the worker, each with its own seed.
+    """
+    return [
+        Algorithms.make_offspring(_worker_graph, parent1, parent2, mutation_rate, crossover, random.Random(seed))
+        for (parent1, parent2), seed in zip(pairs, seeds)
+    ]
+
+
+class OffspringPool:
+    def __init__(self, graph, workers):
+        """
+        Process pool building the offspring of `Algorithms.genetic_algorithm`.
+        The graph is sent once to each worker, then each generation only sends the parents.
+
+        Args:
+            graph (Graph): The graph object.
+            workers (int): Number of worker processes.
+        """
+        self.workers = workers
+        self._pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_annealing_worker, initargs=(graph, None))
+
+    def offspring(self, pairs, mutation_rate, rng, crossover="tours"):
+        """
+        Builds one offspring per pair of parents, with crossover then mutation.
+        Each offspring gets its own seed drawn from `rng`, so the result depends neither on the number
+        of workers nor on the scheduling. The pairs are split into a few chunks per worker to balance the load.
+
+        Args:
+            pairs (list): The (parent1, parent2) pairs.
+            mutation_rate (float): Probability of mutation.
+            rng (random.Random): Source of the seeds of the offspring.
+            crossover (str, optional): The crossover, see `Algorithms.make_offspring`. Defaults to "tours".
+
+        Returns:
+            list: The offspring, in the order of the pairs.
+        """
+        seeds = [rng.getrandbits(64) for _ in pairs]
+        chunk_size = max(1, math.ceil(len(pairs) / (4 * self.workers)))
+        futures = [
+            self._pool.submit(_make_offspring, pairs[k:k + chunk_size], mutation_rate, crossover, seeds[k:k + chunk_size])
+            for k in range(0, len(pairs), chunk_size)
+        ]
+        return [child for future in futures for child in future.result()]
+
+    def close(self):
+        """
+        Shuts the worker processes down.
+        """
+        self._pool.shutdown()
@@ -0,0 +1,349 @@
+import heapq
+import math
+from collections import OrderedDict
+import numpy as np
+import networkx as nx
+
+# Graphs up to this number of nodes get all their shortest paths precomputed at once
+APSP_MAX_NODES = 500
+
+# Memory budget of the single-source shortest path trees kept for larger graphs, in bytes
+CACHE_MEMORY = 256 * 1024 ** 2
+
+# On sparse graphs, a full tree is built for a source once it has been queried this many times
+TREE_AFTER_QUERIES = 8
+
+# Number of paths found by bidirectional searches kept in memory
+PATH_CACHE_SIZE = 100000
+
+
+class ShortestPathOracle:
+    def __init__(self, compact, apsp_max_nodes=APSP_MAX_NODES, cache_size=None):
+        """
+        Answers shortest path queries on a `CompactGraph`, with integer node IDs.
+
+        Small graphs (at most `apsp_max_nodes` nodes) get their all-pairs distance and predecessor
+        matrices computed on the first query. Larger graphs run one Dijkstra per source on demand
+        and keep the last `cache_size` trees in a LRU cache (by default as many as fit in
+        `CACHE_MEMORY`). On sparse graphs a full tree is only built once a source has been queried
+        `TREE_AFTER_QUERIES` times, the queries before are answered by a much cheaper bidirectional
+        search whose paths are kept in a LRU cache as well.
+        Edges with a negative weight are blocked roads (see `contraints.shuffle_graph`) and are
+        never used.
+
+        The oracle is a snapshot of the weights it was built from: `Graph` drops it as soon as an
+        edge changes, so always get it through `Graph.shortest_paths()`.
+
+        Attributes:
+            compact (CompactGraph): The graph the queries are answered on.
+            apsp (bool): True if all the shortest paths are precomputed.
+        """
+        n = compact.number_of_nodes()
+        self.compact = compact
+        self.apsp = n <= apsp_max_nodes
+        # A tree is a float64 distance array and an int64 predecessor array
+        self.cache_size = cache_size if cache_size is not None else max(1, CACHE_MEMORY // (16 * max(n, 1)))
+        self._trees = OrderedDict()
+        self._query_counts = {}
+        self._paths = OrderedDict()
+        self._distances = None
+        self._predecessors = None
+        self._adjacency = None
+
+    def _all_pairs(self):
+        """
+        Computes the all-pairs distance and predecessor matrices with a vectorized Floyd-Warshall.
+        predecessors[i, j] is the node before j on the shortest path from i to j, -1 if there is none.
+        """
+        if self._distances is None:
+            n = self.compact.number_of_nodes()
+            distances = self._weight_matrix()
+            predecessors = np.where(np.isfinite(distances), np.arange(n)[:, None], -1)
+            np.fill_diagonal(distances, 0.0)
+            np.fill_diagonal(predecessors, -1)
+
+            for k in range(n):
+                through_k = distances[:, k, None] + distances[None, k, :]
+                shorter = through_k < distances
+                np.copyto(distances, through_k, where=shorter)
+                np.copyto(predecessors, np.broadcast_to(predecessors[k], (n, n)), where=shorter)
+
+            self._distances = distances
+            self._predecessors = predecessors
+        return self._distances, self._predecessors
+
+    def _weight_matrix(self):
+        """
+        Returns a dense copy of the weights, with infinity for missing and blocked edges.
+        """
+        compact = self.compact
+        n = compact.number_of_nodes()
+        if compact.is_dense:
+            weights = compact.matrix.copy()
+        else:
+            weights = np.full((n, n), np.nan)
+            rows = np.repeat(np.arange(n), np.diff(compact.indptr))
+            weights[rows, compact.indices] = compact.weights
+        weights[~(weights >= 0)] = np.inf  # NaN (no edge) and negative weights (blocked edge)
+        return weights
+
+    def _tree(self, source):
+        """
+        Returns the (distances, predecessors) arrays of the shortest path tree rooted at `source`,
+        from the LRU cache or from a new Dijkstra run.
+        """
+        tree = self._trees.get(source)
+        if tree is not None:
+            self._trees.move_to_end(source)
+            return tree
+
+        tree = self._dijkstra(source)
+        self._trees[source] = tree
+        if len(self._trees) > self.cache_size:
+            self._trees.popitem(last=False)
+        return tree
+
+    def _dijkstra(self, source):
+        """
+        Runs Dijkstra's algorithm from `source`, skipping blocked edges.
+        """
+        compact = self.compact
+        n = compact.number_of_nodes()
+        distances = np.full(n, np.inf)
+        predecessors = np.full(n, -1, dtype=np.int64)
+        distances[source] = 0.0
+
+        if compact.is_dense:
+            # O(n^2) array version, each step settles the closest unvisited node
+            weights = compact.matrix
+            visited = np.zeros(n, dtype=bool)
+            for _ in range(n):
+                candidates = np.where(visited, np.inf, distances)
+                node = int(np.argmin(candidates))
+                if not np.isfinite(candidates[node]):
+                    break
+                visited[node] = True
+                row = weights[node]
+                through_node = distances[node] + row
+                shorter = (row >= 0) & ~visited & (through_node < distances)
+                distances[shorter] = through_node[shorter]
+                predecessors[shorter] = node
+            return distances, predecessors
+
+        adjacency = self._sparse_adjacency()
+        dist = distances.tolist()
+        pred = predecessors.tolist()
+        heap = [(0.0, source)]
+        while heap:
+            d, node = heapq.heappop(heap)
+            if d > dist[node]:
+                continue
+            for neighbor, weight in adjacency[node]:
+                candidate = d + weight
+                if candidate < dist[neighbor]:
+                    dist[neighbor] = candidate
+                    pred[neighbor] = node
+                    heapq.heappush(heap, (candidate, neighbor))
+        return np.array(dist), np.array(pred, dtype=np.int64)
+
+    def _sparse_adjacency(self):
+        """
+        Returns the adjacency lists [(neighbor, weight), ...] of a CSR graph, without the blocked edges.
+        Python lists are much faster than NumPy arrays for the scalar accesses of the search loops.
+        """
+        if self._adjacency is None:
+            compact = self.compact
+            indptr, indices, weights = compact.indptr.tolist(), compact.indices.tolist(), compact.weights.tolist()
+            self._adjacency = [
+                [(indices[k], weights[k]) for k in range(indptr[i], indptr[i + 1]) if weights[k] >= 0]
+                for i in range(compact.number_of_nodes())
+            ]
+        return self._adjacency
+
+    def _bidirectional(self, source, target):
+        """
+        Runs a bidirectional Dijkstra between two nodes of a CSR graph, skipping blocked edges.
+
+        Returns:
+            tuple: (distance, path), or (infinity, None) if the nodes are not connected.
+        """
+        adjacency = self._sparse_adjacency()
+        finalized = [{}, {}]
+        seen = [{source: 0.0}, {target: 0.0}]
+        predecessors = [{source: None}, {target: None}]
+        fringes = [[(0.0, source)], [(0.0, target)]]
+        best, meeting_node = math.inf, None
+
+        direction = 1
+        while fringes[0] and fringes[1]:
+            direction = 1 - direction
+            d, node = heapq.heappop(fringes[direction])
+            if node in finalized[direction]:
+                continue
+            finalized[direction][node] = d
+            if node in finalized[1 - direction]:
+                # Both searches reached this node: no shorter path can be found anymore
+                break
+            for neighbor, weight in adjacency[node]:
+                candidate = d + weight
+                if neighbor in finalized[direction]:
+                    continue
+                if candidate < seen[direction].get(neighbor, math.inf):
+                    seen[direction][neighbor] = candidate
+                    predecessors[direction][neighbor] = node
+                    heapq.heappush(fringes[direction], (candidate, neighbor))
+                    if neighbor in seen[1 - direction]:
+                        total = candidate + seen[1 - direction][neighbor]
+                        if total < best:
+                            best, meeting_node = total, neighbor
+
+        if meeting_node is None:
+            return math.inf, None
+
+        path = []
+        node = meeting_node
+        while node is not None:
+            path.append(node)
+            node = predecessors[0][node]
+        path.reverse()
+        node = predecessors[1][meeting_node]
+        while node is not None:
+            path.append(node)
+            node = predecessors[1][node]
+        return best, path
+
+    def _search(self, source, target):
+        """
+        Finds the shortest path tree to answer a query from, building it if needed.
+
+        Returns:
+            tuple: (tree, reverse, answer) where `tree` is a (distances, predecessors) pair rooted
+                   at the source, or at the target if `reverse` is True. When no tree is worth
+                   building yet, `tree` is None and `answer` holds the (distance, path) found
+                   by a bidirectional search.
+        """
+        if source in self._trees:
+            return self._tree(source), False, None
+        if target in self._trees:
+            # The graph is undirected: the tree of the target answers the query as well
+            return self._tree(target), True, None
+
+        if self.compact.is_dense:
+            return self._tree(source), False, None
+
+        count = self._query_counts.get(source, 0) + 1
+        if count >= TREE_AFTER_QUERIES:
+            self._query_counts.pop(source, None)
+            return self._tree(source), False, None
+        if len(self._query_counts) >= PATH_CACHE_SIZE:
+            self._query_counts.clear()
+        self._query_counts[source] = count
+
+        # The graph is undirected, a path is stored once for both directions
+        key = (source, target) if source < target else (target, source)
+        answer = self._paths.get(key)
+        if answer is not None:
+            self._paths.move_to_end(key)
+        else:
+            answer = self._bidirectional(*key)
+            self._paths[key] = answer
+            if len(self._paths) > PATH_CACHE_SIZE:
+                self._paths.popitem(last=False)
+        distance, path = answer
+        if path is not None and key[0] != source:
+            path = path[::-1]
+        return None, False, (distance, path)
+
+    def distance(self, source, target):
+        """
+        Returns the length of the shortest path between two nodes.
+
+        Args:
+            source (int): The integer ID of the source node.
+            target (int): The integer ID of the target node.
+
+        Returns:
+            float: The length of the shortest path, infinity if the nodes are not connected.
+        """
+        if self.apsp:
+            return float(self._all_pairs()[0][source, target])
+        if source == target:
+            return 0.0
+
+        tree, reverse, answer = self._search(source, target)
+        if tree is None:
+            return answer[0]
+        return float(tree[0][source if reverse else target])
+
+    def distances_from(self, source):
+        """
+        Returns the lengths of the shortest paths from a node to every node.
+
+        Args:
+            source (int): The integer ID of the source node.
+
+        Returns:
+            numpy.ndarray: The distances, infinity for the nodes that cannot be reached.
+        """
+        if self.apsp:
+            return self._all_pairs()[0][source]
+        return self._tree(source)[0]
+
+    def distance_matrix(self):
+        """
+        Returns the lengths of the shortest paths between every pair of nodes.
+        On graphs too large for the all-pairs precomputation, this runs one Dijkstra per node.
+
+        Returns:
+            numpy.ndarray: The (n, n) distance matrix, infinity for the pairs that are not connected.
+        """
+        if self.apsp:
+            return self._all_pairs()[0].copy()
+        n = self.compact.number_of_nodes()
+        distances = np.empty((n, n))
+        for source in range(n):
+            tree = self._trees.get(source)
+            distances[source] = tree[0] if tree is not None else self._dijkstra(source)[0]
+        return distances
+
+    def path(self, source, target):
+        """
+        Returns the shortest path between two nodes.
+
+        Args:
+            source (int): The integer ID of the source node.
+            target (int): The integer ID of the target node.
+
+        Returns:
+            list: The integer IDs of the nodes of the path, from `source` to `target` included.
+
+        Raises:
+            networkx.NetworkXNoPath: If the nodes are not connected.
+        """
+        if source == target:
+            return [source]
+
+        if self.apsp:
+            predecessors, reverse = self._all_pairs()[1][source], False
+        else:
+            tree, reverse, answer = self._search(source, target)
+            if tree is None:
+                if answer[1] is None:
+                    raise nx.NetworkXNoPath(f"No path between {source} and {target}.")
+                return list(answer[1])
+            predecessors = tree[1]
+            if reverse:
+                # Walk the tree of the target, then reverse the path
+                source, target = target, source
+
+        if predecessors[target] < 0:
+            raise nx.NetworkXNoPath(f"No path between {source} and {target}.")
+
+        path = [target]
+        node = target
+        while node != source:
+            node = int(predecessors[node])
+            path.append(node)
+        if not reverse:
+            path.reverse()
+        return path
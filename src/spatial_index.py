@@ -0,0 +1,263 @@
+import heapq
+import numpy as np
+
+from geo import EARTH_RADIUS_KM
+
+# Maximum number of points in a leaf of the tree
+LEAF_SIZE = 32
+
+
+def to_unit_vectors(lon, lat):
+    """
+    Converts coordinates in degrees into points of the unit sphere, where the straight line
+    (chord) distance grows with the great-circle distance.
+
+    Args:
+        lon (array-like): Longitudes, in degrees.
+        lat (array-like): Latitudes, in degrees.
+
+    Returns:
+        numpy.ndarray: The (n, 3) unit vectors.
+    """
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+
+def chord_to_km(chord):
+    """
+    Converts chord lengths on the unit sphere into great-circle distances, in kilometers.
+    """
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2, 0.0, 1.0))
+
+
+def km_to_chord(distance):
+    """
+    Converts a great-circle distance in kilometers into a chord length on the unit sphere.
+    """
+    return 2 * np.sin(np.minimum(distance / EARTH_RADIUS_KM, np.pi) / 2)
+
+
+class SpatialIndex:
+    def __init__(self, coordinates, leaf_size=LEAF_SIZE):
+        """
+        KD-tree over geographic coordinates, for k-nearest neighbor and radius queries in O(log n)
+        per query instead of O(n). The points are indexed as unit vectors in 3D, so distances
+        are great-circle distances (spherical earth) and there is no problem at the antimeridian.
+        The tree is built in O(n log n) and stored in flat arrays.
+
+        Args:
+            coordinates (array-like): (n, 2) array of (longitude, latitude), in degrees.
+            leaf_size (int, optional): Maximum number of points in a leaf. Defaults to LEAF_SIZE.
+
+        Attributes:
+            points (numpy.ndarray): The (n, 3) unit vectors, in the order of the tree leaves.
+            order (numpy.ndarray): order[k] is the index, in `coordinates`, of points[k].
+        """
+        coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+        points = to_unit_vectors(coordinates[:, 0], coordinates[:, 1])
+        order = np.arange(len(points))
+
+        # Node arrays: children (-1 for leaves), point range and bounding box
+        self._left, self._right, self._start, self._end, self._low, self._high = [], [], [], [], [], []
+        if len(points):
+            stack = [(self._new_node(points, order, 0, len(points)), 0, len(points))]
+            while stack:
+                node, start, end = stack.pop()
+                if end - start <= leaf_size:
+                    continue
+                # Split at the median of the widest dimension of the box
+                dim = int(np.argmax(self._high[node] - self._low[node]))
+                middle = (start + end) // 2
+                part = np.argpartition(points[start:end, dim], middle - start)
+                points[start:end] = points[start:end][part]
+                order[start:end] = order[start:end][part]
+                left = self._new_node(points, order, start, middle)
+                right = self._new_node(points, order, middle, end)
+                self._left[node], self._right[node] = left, right
+                stack.append((left, start, middle))
+                stack.append((right, middle, end))
+
+        self.points = points
+        self.order = order
+        self._low = np.array(self._low).reshape(-1, 3)
+        self._high = np.array(self._high).reshape(-1, 3)
+
+    def _new_node(self, points, order, start, end):
+        """
+        Appends a leaf covering points[start:end] to the node arrays and returns its ID.
+        """
+        self._left.append(-1)
+        self._right.append(-1)
+        self._start.append(start)
+        self._end.append(end)
+        self._low.append(points[start:end].min(axis=0))
+        self._high.append(points[start:end].max(axis=0))
+        return len(self._left) - 1
+
+    def __len__(self):
+        return len(self.points)
+
+    def _box_distance(self, node, point):
+        """
+        Squared distance between a point and the bounding box of a node.
+        """
+        gap = np.maximum(self._low[node] - point, 0.0) + np.maximum(point - self._high[node], 0.0)
+        return float(gap @ gap)
+
+    def nearest(self, lon, lat, k=1):
+        """
+        Finds the k points closest to a position.
+
+        Args:
+            lon (float): Longitude of the position, in degrees.
+            lat (float): Latitude of the position, in degrees.
+            k (int, optional): Number of points. Defaults to 1.
+
+        Returns:
+            tuple: (indices, distances), the indices in `coordinates` of the closest points and their
+                   great-circle distances in kilometers, closest first.
+        """
+        point = to_unit_vectors([lon], [lat])[0]
+        k = min(k, len(self))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        best_positions = np.empty(0, dtype=np.int64)
+        best_distances = np.empty(0)
+        bound = np.inf  # Squared distance of the k-th closest point found so far
+        heap = [(0.0, 0)]
+        while heap:
+            box_distance, node = heapq.heappop(heap)
+            if box_distance >= bound:
+                break
+            left = self._left[node]
+            if left >= 0:
+                right = self._right[node]
+                for child in (left, right):
+                    child_distance = self._box_distance(child, point)
+                    if child_distance < bound:
+                        heapq.heappush(heap, (child_distance, child))
+                continue
+
+            start, end = self._start[node], self._end[node]
+            difference = self.points[start:end] - point
+            distances = np.einsum("ij,ij->i", difference, difference)
+            best_positions = np.concatenate((best_positions, np.arange(start, end)))
+            best_distances = np.concatenate((best_distances, distances))
+            if len(best_distances) > k:
+                keep = np.argpartition(best_distances, k - 1)[:k]
+                best_positions, best_distances = best_positions[keep], best_distances[keep]
+            if len(best_distances) == k:
+                bound = float(best_distances.max())
+
+        ranking = np.argsort(best_distances, kind="stable")
+        return self.order[best_positions[ranking]], chord_to_km(np.sqrt(best_distances[ranking]))
+
+    def nearest_all(self, k):
+        """
+        Finds the k closest other points of every indexed point, in O(n log n).
+        The points of a leaf are processed together: the tree is searched once per leaf, with
+        block distance computations between the leaf and the leaves it cannot rule out.
+
+        Args:
+            k (int): Number of neighbors, clipped to n - 1.
+
+        Returns:
+            tuple: (indices, distances), two (n, k) arrays in the order of `coordinates`: the indices
+                   of the closest points and their great-circle distances in kilometers, closest first.
+        """
+        n = len(self)
+        k = min(k, n - 1)
+        indices = np.empty((n, max(k, 0)), dtype=np.int64)
+        distances = np.empty((n, max(k, 0)))
+        if k <= 0:
+            return indices, distances
+
+        for leaf in range(len(self._left)):
+            if self._left[leaf] >= 0:
+                continue
+            start, end = self._start[leaf], self._end[leaf]
+            points = self.points[start:end]
+            best_positions = np.empty((end - start, 0), dtype=np.int64)
+            best_distances = np.empty((end - start, 0))
+            bound = np.inf  # Largest squared distance of the k-th closest points found so far
+            heap = [(0.0, 0)]
+            while heap:
+                box_distance, node = heapq.heappop(heap)
+                if box_distance >= bound:
+                    break
+                left = self._left[node]
+                if left >= 0:
+                    for child in (left, self._right[node]):
+                        child_distance = self._boxes_distance(child, leaf)
+                        if child_distance < bound:
+                            heapq.heappush(heap, (child_distance, child))
+                    continue
+
+                node_start, node_end = self._start[node], self._end[node]
+                block = ((points[:, None, :] - self.points[None, node_start:node_end, :]) ** 2).sum(axis=2)
+                if node == leaf:
+                    np.fill_diagonal(block, np.inf)  # A point is not its own neighbor
+                best_positions = np.hstack((
+                    best_positions, np.broadcast_to(np.arange(node_start, node_end), block.shape)
+                ))
+                best_distances = np.hstack((best_distances, block))
+                if best_distances.shape[1] > k:
+                    keep = np.argpartition(best_distances, k - 1, axis=1)[:, :k]
+                    best_positions = np.take_along_axis(best_positions, keep, axis=1)
+                    best_distances = np.take_along_axis(best_distances, keep, axis=1)
+                if best_distances.shape[1] == k:
+                    bound = float(best_distances.max())
+
+            ranking = np.argsort(best_distances, axis=1, kind="stable")
+            rows = self.order[start:end]
+            indices[rows] = self.order[np.take_along_axis(best_positions, ranking, axis=1)]
+            distances[rows] = chord_to_km(np.sqrt(np.take_along_axis(best_distances, ranking, axis=1)))
+        return indices, distances
+
+    def _boxes_distance(self, a, b):
+        """
+        Squared distance between the bounding boxes of two nodes.
+        """
+        gap = np.maximum(self._low[a] - self._high[b], 0.0) + np.maximum(self._low[b] - self._high[a], 0.0)
+        return float(gap @ gap)
+
+    def within(self, lon, lat, radius):
+        """
+        Finds the points within a distance of a position.
+
+        Args:
+            lon (float): Longitude of the position, in degrees.
+            lat (float): Latitude of the position, in degrees.
+            radius (float): The great-circle distance, in kilometers.
+
+        Returns:
+            tuple: (indices, distances), the indices in `coordinates` of the points and their
+                   great-circle distances in kilometers, closest first.
+        """
+        point = to_unit_vectors([lon], [lat])[0]
+        bound = float(km_to_chord(radius)) ** 2
+        positions, found = [], []
+        stack = [0] if len(self) else []
+        while stack:
+            node = stack.pop()
+            if self._box_distance(node, point) > bound:
+                continue
+            left = self._left[node]
+            if left >= 0:
+                stack.append(left)
+                stack.append(self._right[node])
+                continue
+            start, end = self._start[node], self._end[node]
+            difference = self.points[start:end] - point
+            distances = np.einsum("ij,ij->i", difference, difference)
+            inside = distances <= bound
+            positions.append(np.arange(start, end)[inside])
+            found.append(distances[inside])
+
+        if not positions:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        positions, found = np.concatenate(positions), np.concatenate(found)
+        ranking = np.argsort(found, kind="stable")
+        return self.order[positions[ranking]], chord_to_km(np.sqrt(found[ranking]))
@@ -1 +1 @@
-from src.graph import Graph
\ No newline at end of file
+from src import Graph
\ No newline at end of file
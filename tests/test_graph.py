@@ -1,13 +1,24 @@
 import sys
 from pathlib import Path
 import tracemalloc
+import pickle
+import pytest
+import random
+import numpy as np
+import networkx as nx
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
 sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
 
-from src.graph import Graph
+from graph import Graph
+from geo import geo_distances, vincenty_distances
+from geopy.distance import geodesic
+from compact_graph import CompactGraph
+from contraints import shuffle_graph_vectorized, TrafficProfile
+from algorithms import Algorithms
+from cities import GEONAMES_COLUMNS, load_cities, sample_cities
 
 
 def test_spatial_complexity():
@@ -66,5 +77,223 @@ def test_spatial_complexity():
     print(f"Plot saved to {plot_path}")
 
 
+DATASETS_DIR = Path(__file__).resolve().parent.parent / "data" / "datasets"
+
+
+def test_compact_graph_matches_graph():
+    g = Graph.load(DATASETS_DIR / "size_100" / "graph_size100_density0.1.pkl")
+    nodes = list(g.graph.nodes)
+
+    for dense in (True, False):
+        compact = g.compact(dense=dense)
+        assert compact.is_dense == dense
+        for _ in range(500):
+            u, v = random.sample(nodes, 2)
+            i, j = compact.index[u], compact.index[v]
+            assert compact.has_edge(i, j) == g.graph.has_edge(u, v)
+            assert compact.get_edge_weight(i, j) == g.get_edge_weight(u, v)
+        assert sorted(compact.nodes[k] for k in compact.get_neighbors(0)) == sorted(g.get_neighbors(nodes[0]))
+
+
+def test_sample_extra_edges_is_exact_and_seedable():
+    n = 50
+    available = (n - 1) * (n - 2) // 2
+
+    for k in (0, 10, available // 2, available - 3, available):
+        u, v = Graph._sample_extra_edges(n, k, np.random.default_rng(0))
+        pairs = set(zip(u.tolist(), v.tolist()))
+        assert len(pairs) == k
+        assert all(0 <= a and a + 2 <= b < n for a, b in pairs)
+
+    first = Graph._sample_extra_edges(n, 100, np.random.default_rng(42))
+    second = Graph._sample_extra_edges(n, 100, np.random.default_rng(42))
+    assert np.array_equal(first[0], second[0]) and np.array_equal(first[1], second[1])
+
+
+def test_shortest_path_cache_follows_weight_changes():
+    g = Graph.load(DATASETS_DIR / "size_100" / "graph_size100_density0.01.pkl")
+    nodes = list(g.graph.nodes)
+
+    for _ in range(20):
+        u, v = random.sample(nodes, 2)
+        path = g.shortest_path(u, v)
+        assert path[0] == u and path[-1] == v
+        assert abs(g.shortest_path_length(u, v) - nx.shortest_path_length(g.graph, u, v, weight='weight')) < 1e-6
+
+    # Making an edge of the path very expensive must change the cached answer
+    u, v = nodes[0], nodes[-1]
+    a, b = g.shortest_path(u, v)[:2]
+    g.set_edge_weight(a, b, 1e9)
+    assert abs(g.shortest_path_length(u, v) - nx.shortest_path_length(g.graph, u, v, weight='weight')) < 1e-6
+
+
+def test_direct_weight_writes_drop_the_caches():
+    for lazy in (True, False):
+        g = Graph.load(DATASETS_DIR / "size_100" / "graph_size100_density0.01.pkl", lazy=lazy)
+        nodes = list(g.graph.nodes)
+        u, v = nodes[0], nodes[-1]
+        closure = g.metric_closure()
+        a, b = g.shortest_path(u, v)[:2]
+
+        # Writing in the networkx graph instead of using set_edge_weight
+        g.graph[a][b]['weight'] = 1e9
+        assert g.compact().get_edge_weight(g.compact().index[a], g.compact().index[b]) == 1e9
+        assert abs(g.shortest_path_length(u, v) - nx.shortest_path_length(g.graph, u, v, weight='weight')) < 1e-6
+        assert g.metric_closure() is not closure
+        g.graph.edges[a, b]['weight'] = 1.0
+        assert g.shortest_path_length(a, b) == 1.0
+
+    # The edges are still saved as plain dicts
+    copy = pickle.loads(pickle.dumps(g))
+    assert type(copy.graph[a][b]) is dict and copy.get_edge_weight(a, b) == 1.0
+
+
+def test_geodesic_distances_match_geopy():
+    rng = np.random.default_rng(0)
+    lat1, lat2 = rng.uniform(42.3, 51.1, (2, 500))
+    lon1, lon2 = rng.uniform(-4.8, 8.2, (2, 500))
+    # Coincident points and a nearly antipodal equatorial pair, for which Vincenty does not converge
+    lat1, lon1 = np.append(lat1, [45.75, 0.0]), np.append(lon1, [4.85, 0.0])
+    lat2, lon2 = np.append(lat2, [45.75, 0.5]), np.append(lon2, [4.85, 179.7])
+
+    expected = [geodesic((a, b), (c, d)).km for a, b, c, d in zip(lat1, lon1, lat2, lon2)]
+    assert np.allclose(geo_distances(lat1, lon1, lat2, lon2), expected, rtol=0, atol=1e-6)
+    assert np.allclose(vincenty_distances(lat1, lon1, lat2, lon2), expected, rtol=0, atol=1e-6)
+    assert geo_distances(45.75, 4.85, 45.75, 4.85)[0] == 0
+    assert geo_distances(0.0, 0.0, 0.5, 179.7)[0] == pytest.approx(19944.12742075, abs=1e-6)
+
+
+def test_spatial_queries_match_brute_force():
+    g = Graph.load(DATASETS_DIR / "size_1000" / "graph_size1000_density0.001.pkl")
+    nodes = list(g.graph.nodes)
+    positions = np.array([g.graph.nodes[node]['pos'] for node in nodes])
+
+    for node in random.sample(nodes, 30):
+        lon, lat = g.graph.nodes[node]['pos']
+        distances = geo_distances(lat, lon, positions[:, 1], positions[:, 0], method="haversine")
+        expected = sorted(d for d, other in zip(distances.tolist(), nodes) if other != node)
+        assert np.allclose([d for _, d in g.nearest_nodes(node, 5)], expected[:5])
+        assert len(g.nodes_within(node, 25)) == sum(d <= 25 for d in expected)
+
+    # Geometric edges replace the random ones and the graph stays connected
+    g.graph.remove_edges_from(list(g.graph.edges))
+    g._add_geometric_edges(k=3)
+    assert nx.is_connected(g.graph)
+    assert all(g.graph.has_edge(node, g.nearest_nodes(node)[0][0]) for node in nodes[:50])
+
+
+def test_vectorized_shuffle_is_seeded_and_keeps_compact_in_sync():
+    weights = []
+    for _ in range(2):
+        g = Graph.load(DATASETS_DIR / "size_100" / "graph_size100_density0.1.pkl")
+        before = {edge: g.get_edge_weight(*edge) for edge in g.graph.edges}
+        changed = []
+        shuffle_graph_vectorized(g, "18:00", seed=7, changed_edges=changed)
+        weights.append({edge: g.get_edge_weight(*edge) for edge in g.graph.edges})
+
+        assert changed
+        assert {frozenset(edge) for edge in changed} == {
+            frozenset(edge) for edge in before if weights[-1][edge] != before[edge]
+        }
+        assert all(weights[-1][edge] == -1 or weights[-1][edge] >= before[edge] for edge in before)
+
+        compact = g.compact()
+        fresh = CompactGraph.from_graph(g, dense=compact.is_dense)
+        us, vs, _ = fresh.edge_arrays()
+        assert np.array_equal(compact.get_edge_weights(us, vs), fresh.get_edge_weights(us, vs))
+    assert weights[0] == weights[1]
+
+
+def test_traffic_profile_keeps_base_weights():
+    g = Graph.load(DATASETS_DIR / "size_100" / "graph_size100_density0.1.pkl")
+    before = {edge: g.get_edge_weight(*edge) for edge in g.graph.edges}
+    g.traffic = TrafficProfile.from_graph(g, seed=3)
+    assert np.array_equal(g.traffic.multipliers, TrafficProfile.from_graph(g, seed=3).multipliers)
+    assert g.traffic.multipliers.shape == (len(before), 24)
+
+    scenario = g.compact_at("18:30")
+    assert g.compact().is_dense and not scenario.is_dense
+    assert scenario.indices is g.compact_at(3).indices
+    assert {edge: g.get_edge_weight(*edge) for edge in g.graph.edges} == before
+    for u, v in list(before)[:200]:
+        expected = g.get_edge_weight(u, v, time=18)
+        assert scenario.get_edge_weight(scenario.index[u], scenario.index[v]) == pytest.approx(expected)
+        assert expected == -1 or expected >= before[(u, v)]
+
+    edges = list(before)[:10]
+    solution = {k: [u, v, u] for k, (u, v) in enumerate(edges)}
+    hourly = Algorithms.compute_hourly_costs(g, solution)
+    for hour in range(24):
+        costs = [g.get_edge_weight(u, v, time=hour) for u, v in edges]
+        expected = np.inf if min(costs) < 0 else 2 * sum(costs)
+        assert hourly[hour] == pytest.approx(expected)
+
+
+def test_array_format_round_trip(tmp_path):
+    for density in ("0.01", "0.1"):
+        path = DATASETS_DIR / "size_100" / f"graph_size100_density{density}.pkl"
+        g = Graph.load(path)
+        directory = Graph.convert_pickle(str(path), str(tmp_path / density))
+
+        compact = CompactGraph.load(directory)
+        arrays = [compact.matrix] if compact.is_dense else [compact.indptr, compact.indices, compact.weights]
+        assert compact.is_dense == g.compact().is_dense
+        assert all(isinstance(array, np.memmap) for array in arrays)
+        us, vs, weights = g.compact().edge_arrays()
+        assert compact.nodes == g.compact().nodes
+        assert np.array_equal(compact.get_edge_weights(us, vs), weights)
+
+        loaded = Graph.load(directory)
+        assert loaded.positions == g.positions
+        assert {frozenset(e): w for *e, w in loaded.graph.edges(data="weight")} == {
+            frozenset(e): w for *e, w in g.graph.edges(data="weight")
+        }
+
+
+def test_lazy_graph_builds_networkx_on_demand(tmp_path):
+    path = DATASETS_DIR / "size_100" / "graph_size100_density0.1.pkl"
+    g = Graph.load(path)
+    lazy = Graph.load(Graph.convert_pickle(str(path), str(tmp_path / "graph")))
+    assert lazy.is_lazy
+
+    node = lazy.get_nodes()[0]
+    assert lazy.get_nodes() == list(g.graph.nodes)
+    assert sorted(lazy.get_neighbors(node)) == sorted(g.get_neighbors(node))
+    tours = {0: [node] + lazy.get_neighbors(node)[:1] + [node]}
+    assert lazy.calculate_distances(tours) == g.calculate_distances(tours)
+    edges = list(g.graph.edges)[:3]
+    lazy.set_edge_weights(edges, [1.0, 2.0, 3.0])
+    assert lazy.is_lazy and lazy.compact().get_edge_weight(*[lazy.compact().index[x] for x in edges[1]]) == 2.0
+
+    assert lazy.graph.number_of_edges() == g.graph.number_of_edges()
+    assert not lazy.is_lazy
+    assert [lazy.get_edge_weight(*edge) for edge in edges] == [1.0, 2.0, 3.0]
+
+
+def test_city_table_is_cached_and_samples_like_pandas(tmp_path):
+    rng = np.random.default_rng(0)
+    rows = pd.DataFrame({column: "" for column in GEONAMES_COLUMNS}, index=range(300))
+    rows["name"] = [f"City{i}" for i in range(300)]
+    rows["latitude"] = np.round(rng.uniform(42, 51, 300), 5)
+    rows["longitude"] = np.round(rng.uniform(-4, 8, 300), 5)
+    rows["feature_class"] = rng.choice(["P", "A"], 300, p=[0.8, 0.2])
+    rows["population"] = rng.integers(0, 10 ** 5, 300)
+    path = tmp_path / "cities.txt"
+    rows.to_csv(path, sep="\t", header=False, index=False)
+
+    expected = pd.read_csv(path, sep="\t", header=None, names=GEONAMES_COLUMNS)
+    expected = expected[expected["feature_class"] == "P"].sample(n=50, random_state=42)
+    sample = sample_cities(50, str(path))
+    assert sample["name"].tolist() == expected["name"].tolist()
+    assert sample["latitude"].tolist() == expected["latitude"].tolist()
+    assert sample["longitude"].tolist() == expected["longitude"].tolist()
+
+    names, coordinates, _ = load_cities(str(path))
+    assert isinstance(names, np.memmap) and coordinates.dtype == np.float32
+
+    rows[rows["feature_class"] == "P"].head(10).to_csv(path, sep="\t", header=False, index=False)
+    assert len(load_cities(str(path))[0]) == 10
+
+
 print("Starting space complexity test")
 
@@ -1,4 +1,8 @@
 import sys
+import random
+import time
+import itertools
+import numpy as np
 from pathlib import Path
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -12,6 +16,9 @@ sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
 
 from graph import Graph
 from algorithms import Algorithms
+from local_search import LocalSearch
+from anytime import AnnealingSolver, GeneticSolver
+from parallel import multi_start_annealing, parallel_tempering
 
 
 def profile_simulated_annealing(n, density, initial_temp, min_temp, cooling_rate, max_iter, num_vehicles):
@@ -122,5 +129,283 @@ def run_profiling_all():
     plt.savefig(plot_path)
     print(f"📊 Plot saved to {plot_path}")
 
+DATASETS_DIR = Path(__file__).resolve().parent.parent / "data" / "datasets"
+
+
+def test_move_delta_matches_full_cost():
+    g = Graph.load(DATASETS_DIR / "size_10" / "graph_size10_density1.pkl")
+    nodes = list(g.graph.nodes)
+    start_node = nodes.pop(0)
+    solution = Algorithms.initialize_solution(nodes, start_node, 3, g)
+    cost = Algorithms.compute_total_cost(g, solution)
+
+    for _ in range(200):
+        neighbor, delta = Algorithms.generate_neighbor_with_delta(g, solution)
+        neighbor_cost = Algorithms.compute_total_cost(g, neighbor)
+        assert abs((cost + delta) - neighbor_cost) < 1e-6
+        solution, cost = neighbor, neighbor_cost
+
+
+def test_undo_move_restores_solution():
+    g = Graph.load(DATASETS_DIR / "size_10" / "graph_size10_density1.pkl")
+    nodes = list(g.graph.nodes)
+    start_node = nodes.pop(0)
+    solution = Algorithms.initialize_solution(nodes, start_node, 3, g)
+    original = Algorithms.copy_solution(solution)
+
+    undo_log = []
+    for _ in range(50):
+        move = Algorithms.random_move(solution)
+        if move is not None:
+            undo_log.append(Algorithms.apply_move(solution, move))
+    for undo in reversed(undo_log):
+        Algorithms.undo_move(solution, undo)
+
+    assert solution == original
+
+
+def test_batched_costs_match_compute_total_cost():
+    g = Graph.load(DATASETS_DIR / "size_10" / "graph_size10_density0.5.pkl")
+    solutions = []
+    for _ in range(5):
+        nodes = list(g.graph.nodes)
+        start_node = nodes.pop(0)
+        solutions.append(Algorithms.initialize_solution(nodes, start_node, 3, g))
+
+    costs = Algorithms.compute_total_costs(g, solutions)
+    for solution, cost in zip(solutions, costs):
+        assert abs(cost - Algorithms.compute_total_cost(g, solution)) < 1e-6
+
+
+def test_move_feasibility_matches_full_validation():
+    g = Graph.load(DATASETS_DIR / "size_10" / "graph_size10_density0.5.pkl")
+    nodes = list(g.graph.nodes)
+    start_node = nodes.pop(0)
+    solution = Algorithms.initialize_solution(nodes, start_node, 3, g)
+
+    for _ in range(500):
+        move = Algorithms.random_move(solution)
+        if move is None:
+            continue
+        feasible = Algorithms.move_is_feasible(g, solution, move)
+        Algorithms.apply_move(solution, move)
+        assert feasible == Algorithms.validate_solution(g, solution)
+        if not feasible:
+            Algorithms.undo_move(solution, move)
+
+
+def test_parallel_tempering_returns_valid_solution():
+    g = Graph.load(DATASETS_DIR / "size_10" / "graph_size10_density0.5.pkl")
+    solution, _ = parallel_tempering(g, 1, 100, 3, 2, rounds=3, iterations_per_round=50, max_workers=2, seed=0)
+
+    assert Algorithms.validate_solution(g, solution)
+    assert set(node for tour in solution.values() for node in tour) == set(g.graph.nodes)
+
+
+def test_seeded_runs_are_reproducible():
+    g = Graph.load(DATASETS_DIR / "size_10" / "graph_size10_density0.5.pkl")
+    first, _ = Algorithms.simulated_annealing(g, 100, 1, 0.9, 50, 2, seed=7)
+    second, _ = Algorithms.simulated_annealing(g, 100, 1, 0.9, 50, 2, seed=7)
+    assert first == second
+
+    best, results = multi_start_annealing(g, 3, 100, 1, 0.9, 50, 2, seed=7, max_workers=2)
+    assert [result["run"] for result in results] == [0, 1, 2]
+    assert Algorithms.compute_total_cost(g, best) == min(result["cost"] for result in results)
+    replay, _ = Algorithms.simulated_annealing(g, 100, 1, 0.9, 50, 2, seed=results[0]["seed"])
+    assert Algorithms.compute_total_cost(g, replay) == results[0]["cost"]
+
+
+def test_parallel_genetic_algorithm_is_reproducible():
+    g = Graph.load(DATASETS_DIR / "size_10" / "graph_size10_density0.5.pkl")
+    for crossover in ("tours", "ox"):
+        runs = [
+            Algorithms.genetic_algorithm(g, 20, 3, 0.3, 2, workers=workers, seed=3, crossover=crossover)
+            for workers in (1, 2, 3)
+        ]
+        assert runs[0] == runs[1] == runs[2]
+        assert Algorithms.validate_solution(g, runs[0][0])
+
+
+def test_giant_tour_crossovers_return_permutations():
+    rng = random.Random(0)
+    operators = (
+        Algorithms.order_crossover,
+        Algorithms.partially_mapped_crossover,
+        Algorithms.edge_recombination_crossover,
+    )
+    for operator in operators:
+        for n in (1, 2, 5, 50):
+            for _ in range(20):
+                parent1, parent2 = rng.sample(range(n), n), rng.sample(range(n), n)
+                assert sorted(operator(parent1, parent2, rng)) == list(range(n))
+
+
+def test_split_giant_tour_is_optimal():
+    g = Graph.load(DATASETS_DIR / "size_10" / "graph_size10_density0.5.pkl")
+    closure = g.metric_closure()
+    rng = random.Random(1)
+    depot = 0
+    for _ in range(20):
+        giant_tour = rng.sample(range(1, 10), 9)
+        num_vehicles = rng.randint(1, 4)
+        solution = Algorithms.split_giant_tour(closure, giant_tour, depot, num_vehicles)
+
+        best = min(
+            Algorithms.compute_total_cost(closure, {
+                v: [depot] + giant_tour[bounds[v]:bounds[v + 1]] + [depot] for v in range(num_vehicles)
+            })
+            for cuts in itertools.combinations(range(1, 9), num_vehicles - 1)
+            for bounds in [(0,) + cuts + (9,)]
+        )
+        assert abs(Algorithms.compute_total_cost(closure, solution) - best) < 1e-6
+        assert [node for v in range(num_vehicles) for node in solution[v][1:-1]] == giant_tour
+
+
+def test_local_search_reaches_a_local_optimum():
+    g = Graph.load(DATASETS_DIR / "size_100" / "graph_size100_density0.1.pkl")
+    closure = g.metric_closure()
+    nodes = list(range(1, closure.number_of_nodes()))
+    solution = Algorithms.initialize_solution(nodes, 0, 4, closure, random.Random(0))
+    cost = Algorithms.compute_total_cost(closure, solution)
+
+    engine = LocalSearch(closure)
+    improved, gain = engine.improve(solution)
+    assert gain > 0
+    assert abs(cost - gain - Algorithms.compute_total_cost(closure, improved)) < 1e-6
+    assert sorted(node for tour in improved.values() for node in tour[1:-1]) == sorted(nodes)
+    assert engine.improve(improved)[1] == 0
+
+
+def test_local_search_can_keep_every_route():
+    g = Graph.load(DATASETS_DIR / "size_100" / "graph_size100_density0.1.pkl")
+    closure = g.metric_closure()
+    nodes = list(range(1, closure.number_of_nodes()))
+    solution = Algorithms.initialize_solution(nodes, 0, 30, closure, random.Random(0))
+
+    emptied, _ = LocalSearch(closure).improve(solution)
+    assert any(len(tour) == 2 for tour in emptied.values())
+
+    kept, gain = LocalSearch(closure, keep_routes=True).improve(solution)
+    assert gain > 0 and all(len(tour) > 2 for tour in kept.values())
+    giant_tour = [node for v in sorted(kept) for node in kept[v][1:-1]]
+    split = Algorithms.split_giant_tour(closure, giant_tour, 0, 30)
+    assert Algorithms.compute_total_cost(closure, split) <= Algorithms.compute_total_cost(closure, kept) + 1e-6
+
+
+def test_mip_solve_is_optimal():
+    g = Graph.load(DATASETS_DIR / "size_10" / "graph_size10_density0.5.pkl")
+    closure = g.metric_closure()
+    depot = closure.nodes[0]
+    solution, report = Algorithms.mip_solve(g, 2, depot=depot, time_limit=60)
+    assert report["optimal"] and report["gap"] == 0
+    assert Algorithms.validate_solution(g, solution)
+    assert abs(Algorithms.compute_total_cost(g, solution) - report["cost"]) < 1e-6
+    assert {node for tour in solution.values() for node in tour} == set(g.graph.nodes)
+
+    # Brute force: every order of the nodes, cut once into two non-empty tours
+    d = closure.matrix
+    orders = np.array(list(itertools.permutations(range(1, closure.number_of_nodes()))))
+    path = d[orders[:, :-1], orders[:, 1:]]
+    base = path.sum(axis=1) + d[0, orders[:, 0]] + d[orders[:, -1], 0]
+    best = min(
+        (base - path[:, cut - 1] + d[orders[:, cut - 1], 0] + d[0, orders[:, cut]]).min()
+        for cut in range(1, orders.shape[1])
+    )
+    assert abs(report["cost"] - best) < 1e-6
+
+    # More vehicles than customers: one customer per tour, the other vehicles stay at the depot
+    solution, report = Algorithms.mip_solve(g, 12, depot=depot, time_limit=60)
+    assert sorted(solution) == list(range(12))
+    assert report["optimal"] and Algorithms.validate_solution(g, solution)
+    assert sum(len(tour) == 1 for tour in solution.values()) == 12 - (closure.number_of_nodes() - 1)
+    assert abs(report["cost"] - 2 * np.nansum(d[0, 1:])) < 1e-6
+
+
+def test_cbc_lower_bound_is_read_from_the_log():
+    # Lines of the log of a solve stopped by its time limit
+    log = ("At line 2430004 BOUNDS\n"
+           "Objective value:                780931.62000000\n"
+           "Lower bound:                    392241.980\n")
+    assert Algorithms._cbc_lower_bound(log) == 392241.98
+    assert Algorithms._cbc_lower_bound("Objective value:                780931.62000000\n", 5.0) == 5.0
+    assert Algorithms._cbc_solver(msg=False).available()
+
+
+def test_adaptive_schedule_calibrates_and_stops_in_time():
+    g = Graph.load(DATASETS_DIR / "size_100" / "graph_size100_density0.1.pkl")
+    closure = g.metric_closure()
+    nodes = list(range(1, closure.number_of_nodes()))
+    solution = Algorithms.initialize_solution(nodes, 0, 4, closure, random.Random(0))
+    before = Algorithms.copy_solution(solution)
+    temp = Algorithms.calibrate_temperature(closure, solution, random.Random(0))
+    assert temp > 0 and solution == before
+
+    first, elapsed_time = Algorithms.simulated_annealing(g, 1000, 0.01, 0.95, 100, 4, metric_closure=True, seed=3,
+                                                         schedule="adaptive", time_limit=0.5)
+    assert elapsed_time < 2
+    assert Algorithms.validate_solution(g, first)
+    second, _ = Algorithms.simulated_annealing(g, 1000, 0.01, 0.95, 100, 4, metric_closure=True, seed=3,
+                                               schedule="adaptive", max_stagnation=5)
+    third, _ = Algorithms.simulated_annealing(g, 1000, 0.01, 0.95, 100, 4, metric_closure=True, seed=3,
+                                              schedule="adaptive", max_stagnation=5)
+    assert second == third
+
+
+def test_anytime_solvers_can_be_resumed():
+    g = Graph.load(DATASETS_DIR / "size_100" / "graph_size100_density0.1.pkl")
+    parameters = (1000, 1, 0.9, 2500, 4)
+
+    reference = AnnealingSolver(g, *parameters, metric_closure=True, seed=5)
+    reference.run()
+    costs = []
+    solver = AnnealingSolver(g, *parameters, metric_closure=True, seed=5, callback=lambda s: costs.append(s.best_cost))
+    while not solver.done:
+        solution, cost = solver.run(max_steps=7)
+        assert Algorithms.validate_solution(g, solution)
+        assert abs(Algorithms.compute_total_cost(g, solution) - cost) < 1e-6 * cost
+    assert solver.best_solution == reference.best_solution
+    assert len(costs) == solver.steps and costs == sorted(costs, reverse=True)
+
+    # A deadline is met, and the search goes on afterwards
+    solver = AnnealingSolver(g, 1000, 0.001, 0.999, 10000, 4, metric_closure=True, seed=5)
+    start = time.monotonic()
+    solver.run(until=start + 0.3)
+    assert time.monotonic() - start < 0.5 and not solver.done
+    steps = solver.steps
+    solver.run(max_steps=3)
+    assert solver.steps == steps + 3
+
+    with GeneticSolver(g, 20, 6, 0.1, 4, seed=2, crossover="ox") as genetic:
+        genetic.run(max_steps=2)
+        assert genetic.generation == 2
+        best_solution, best_cost = genetic.run()
+    assert genetic.done and genetic.generation == 6
+    assert Algorithms.validate_solution(g, best_solution)
+    assert Algorithms.genetic_algorithm(g, 20, 6, 0.1, 4, seed=2, crossover="ox")[0] == best_solution
+
+
+def test_reoptimize_repairs_only_the_changed_tours():
+    g = Graph.load(DATASETS_DIR / "size_100" / "graph_size100_density0.1.pkl")
+    Algorithms.simulated_annealing(g, 1000, 1, 0.9, 100, 5, metric_closure=True, seed=0)
+    before = {vehicle_id: list(tour) for vehicle_id, tour in g.tsp_paths.items()}
+
+    # Block an edge of the first tour, and change the weight of an edge no tour uses
+    u, v = before[0][1], before[0][2]
+    g.set_edge_weight(u, v, -1)
+    used = {frozenset(edge) for tour in before.values() for edge in zip(tour, tour[1:])}
+    unused = next(edge for edge in g.graph.edges if frozenset(edge) not in used)
+    g.set_edge_weight(*unused, 1.0)
+
+    after = Algorithms.reoptimize(g, [(v, u), unused])
+    assert after == g.tsp_paths
+    for vehicle_id, tour in before.items():
+        if frozenset((u, v)) in {frozenset(edge) for edge in zip(tour, tour[1:])}:
+            assert all(frozenset(edge) != frozenset((u, v)) for edge in zip(after[vehicle_id], after[vehicle_id][1:]))
+        else:
+            assert after[vehicle_id] == tour
+    assert Algorithms.validate_solution(g, after)
+    assert set(node for tour in after.values() for node in tour) == set(g.graph.nodes)
+
+
 if __name__ == "__main__":
     test_run_profiling_all()
\ No newline at end of file